@@ -52,6 +52,7 @@ local socket = require("socket")
 local PORT = tonumber(os.getenv("REAPER_MCP_PORT")) or 9500
 local HOST = "127.0.0.1"
 local MAX_MSG_SIZE = 10 * 1024 * 1024  -- 10MB max message
+local BRIDGE_VERSION = "0.4.1"
 
 -- ============================================================================
 -- JSON codec (minimal, no external deps)
@@ -118,6 +119,13 @@ function json.decode(str)
         pos = pos + 1  -- skip opening "
         local parts = {}
         while pos <= #str do
+            -- Copy everything up to the next quote or backslash in one piece
+            local stop = str:find('["\\]', pos)
+            if not stop then break end
+            if stop > pos then
+                table.insert(parts, str:sub(pos, stop - 1))
+                pos = stop
+            end
             local c = str:sub(pos, pos)
             if c == '"' then
                 pos = pos + 1
@@ -153,9 +161,6 @@ function json.decode(str)
                     end
                 end
                 pos = pos + 1
-            else
-                table.insert(parts, c)
-                pos = pos + 1
             end
         end
         error("Unterminated string")
@@ -248,11 +253,48 @@ function json.decode(str)
     else return nil, result end
 end
 
+-- ============================================================================
+-- Script helpers (globals, so user and tool scripts can call them)
+-- ============================================================================
+
+-- Changes whenever the project does (or another project tab becomes
+-- current); lets callers reuse data derived from it
+local function project_generation()
+    local proj = reaper.EnumProjects(-1)
+    return tostring(proj) .. ":" .. reaper.GetProjectStateChangeCount(proj)
+end
+
+-- Lowercased track names in track order, rebuilt when the project changes
+local track_name_cache = { generation = nil, tracks = {}, names = {} }
+
+function _resolve_track_by_substring(target_lower)
+    -- First track whose lowercased name contains target_lower (plain text,
+    -- already lowercased). Returns the track and its 0-based index, or nil.
+    local generation = project_generation()
+    if track_name_cache.generation ~= generation then
+        local tracks, names = {}, {}
+        for i = 0, reaper.CountTracks(0) - 1 do
+            local tr = reaper.GetTrack(0, i)
+            local _, name = reaper.GetTrackName(tr)
+            tracks[i + 1] = tr
+            names[i + 1] = name:lower()
+        end
+        track_name_cache = { generation = generation, tracks = tracks, names = names }
+    end
+    local names = track_name_cache.names
+    for i = 1, #names do
+        if names[i]:find(target_lower, 1, true) then
+            return track_name_cache.tracks[i], i - 1
+        end
+    end
+    return nil
+end
+
 -- ============================================================================
 -- Script execution engine
 -- ============================================================================
 
-local function execute_script(code, undo_label, timeout_ms)
+local function execute_script(code, undo_label, timeout_ms, chunk, args)
     undo_label = undo_label or "AI Script"
     timeout_ms = timeout_ms or 120000
     local timeout_sec = timeout_ms / 1000.0
@@ -274,8 +316,11 @@ local function execute_script(code, undo_label, timeout_ms)
         table.insert(output, tostring(msg))
     end
 
-    -- Compile
-    local chunk, compile_err = load(code, "user_script")
+    -- Compile (exec_cached hands over a chunk it already loaded)
+    local compile_err
+    if not chunk then
+        chunk, compile_err = load(code, "user_script")
+    end
     if not chunk then
         -- Restore
         print = old_print
@@ -341,7 +386,7 @@ local function execute_script(code, undo_label, timeout_ms)
             message = tostring(e),
             traceback = debug.traceback(e, 2)
         }
-    end)
+    end, args)
     local elapsed = (reaper.time_precise() - start_time) * 1000
 
     -- Always clear the hook
@@ -361,7 +406,10 @@ local function execute_script(code, undo_label, timeout_ms)
             result = err_or_result,
             stdout = table.concat(output, "\n"),
             error = nil,
-            elapsed_ms = elapsed
+            elapsed_ms = elapsed,
+            -- Taken after the undo block closed, so it still matches on the
+            -- next call unless something else changed the project
+            generation = project_generation()
         }
     else
         -- Extract line number from traceback
@@ -402,10 +450,45 @@ function commands.exec(params)
     return execute_script(params.code, params.undo_label, params.timeout_ms)
 end
 
+-- Chunks loaded by exec_cached, by client-chosen key: {chunk = f, code = src}
+local cached_scripts = {}
+
+function commands.exec_cached(params)
+    -- Like exec, but the compiled chunk is kept under params.key. The client
+    -- sends params.code only the first time; without it an unknown key
+    -- answers { missing = true } so the client can resend. params.args is
+    -- passed to the chunk as ...
+    local entry = cached_scripts[params.key]
+    if params.code and not (entry and entry.code == params.code) then
+        local chunk = load(params.code, "user_script")
+        if not chunk then
+            -- Let execute_script report the compile error
+            return execute_script(params.code, params.undo_label, params.timeout_ms)
+        end
+        entry = { chunk = chunk, code = params.code }
+        cached_scripts[params.key] = entry
+    elseif not entry then
+        return { missing = true }
+    end
+    return execute_script(entry.code, params.undo_label, params.timeout_ms,
+                          entry.chunk, params.args)
+end
+
 function commands.ping()
     return { pong = true, time = reaper.time_precise() }
 end
 
+-- Framing requested by the client's hello; applied once the reply is sent
+local requested_framing = nil
+
+function commands.hello(params)
+    -- Version handshake. Clients that ask for "length" framing get 4-byte
+    -- big-endian length-prefixed messages for the rest of the connection.
+    local framing = params and params.framing == "length" and "length" or "newline"
+    requested_framing = framing
+    return { version = BRIDGE_VERSION, framing = framing }
+end
+
 function commands.startup(params)
     local action = params and params.action or "status"
     local resource = reaper.GetResourcePath()
@@ -508,6 +591,82 @@ function commands.startup(params)
     end
 end
 
+-- Per-track fields of the state dump, one getter per key
+local track_fields = {}
+
+function track_fields.name(track)
+    local _, name = reaper.GetTrackName(track)
+    return name
+end
+
+function track_fields.guid(track)
+    return reaper.GetTrackGUID(track)
+end
+
+function track_fields.volume_db(track)
+    local db = 20 * math.log(reaper.GetMediaTrackInfo_Value(track, "D_VOL"), 10)
+    return math.floor(db * 10 + 0.5) / 10
+end
+
+function track_fields.volume_linear(track)
+    return reaper.GetMediaTrackInfo_Value(track, "D_VOL")
+end
+
+function track_fields.pan(track)
+    return reaper.GetMediaTrackInfo_Value(track, "D_PAN")
+end
+
+function track_fields.mute(track)
+    return reaper.GetMediaTrackInfo_Value(track, "B_MUTE") == 1
+end
+
+function track_fields.solo(track)
+    return reaper.GetMediaTrackInfo_Value(track, "I_SOLO") > 0
+end
+
+function track_fields.armed(track)
+    return reaper.GetMediaTrackInfo_Value(track, "I_RECARM") == 1
+end
+
+function track_fields.num_items(track)
+    return reaper.CountTrackMediaItems(track)
+end
+
+function track_fields.items(track)
+    local items_info = {}
+    for item_idx = 0, reaper.CountTrackMediaItems(track) - 1 do
+        local item = reaper.GetTrackMediaItem(track, item_idx)
+        local pos = reaper.GetMediaItemInfo_Value(item, "D_POSITION")
+        local len = reaper.GetMediaItemInfo_Value(item, "D_LENGTH")
+        local take = reaper.GetActiveTake(item)
+        local item_info = {
+            position = pos,
+            length = len,
+            is_midi = false,
+            note_count = 0
+        }
+        if take then
+            item_info.is_midi = reaper.TakeIsMIDI(take)
+            if item_info.is_midi then
+                local _, note_count = reaper.MIDI_CountEvts(take)
+                item_info.note_count = note_count
+            end
+        end
+        table.insert(items_info, item_info)
+    end
+    return items_info
+end
+
+function track_fields.fx(track)
+    local fx_list = {}
+    for fx = 0, reaper.TrackFX_GetCount(track) - 1 do
+        local _, fx_name = reaper.TrackFX_GetFXName(track, fx)
+        local enabled = reaper.TrackFX_GetEnabled(track, fx)
+        table.insert(fx_list, { name = fx_name, enabled = enabled, index = fx })
+    end
+    return fx_list
+end
+
 function commands.state()
     -- Full project state dump
     local state = {
@@ -522,6 +681,9 @@ function commands.state()
         regions = {},
     }
 
+    -- Changes whenever the project does; lets clients reuse derived data
+    state.generation = project_generation()
+
     -- Time signature
     local ts_num, ts_den = reaper.TimeMap_GetTimeSigAtTime(0, 0)
     state.time_sig = { numerator = ts_num, denominator = ts_den }
@@ -533,62 +695,13 @@ function commands.state()
     state.project_path = proj_path
 
     -- Tracks
-    local num_tracks = reaper.CountTracks(0)
-    for i = 0, num_tracks - 1 do
+    for i = 0, reaper.CountTracks(0) - 1 do
         local track = reaper.GetTrack(0, i)
-        local _, name = reaper.GetTrackName(track)
-        local vol = reaper.GetMediaTrackInfo_Value(track, "D_VOL")
-        local pan = reaper.GetMediaTrackInfo_Value(track, "D_PAN")
-        local mute = reaper.GetMediaTrackInfo_Value(track, "B_MUTE")
-        local solo = reaper.GetMediaTrackInfo_Value(track, "I_SOLO")
-        local armed = reaper.GetMediaTrackInfo_Value(track, "I_RECARM")
-        local num_items = reaper.CountTrackMediaItems(track)
-        local num_fx = reaper.TrackFX_GetCount(track)
-
-        local fx_list = {}
-        for fx = 0, num_fx - 1 do
-            local _, fx_name = reaper.TrackFX_GetFXName(track, fx)
-            local enabled = reaper.TrackFX_GetEnabled(track, fx)
-            table.insert(fx_list, { name = fx_name, enabled = enabled, index = fx })
-        end
-
-        local items_info = {}
-        for item_idx = 0, num_items - 1 do
-            local item = reaper.GetTrackMediaItem(track, item_idx)
-            local pos = reaper.GetMediaItemInfo_Value(item, "D_POSITION")
-            local len = reaper.GetMediaItemInfo_Value(item, "D_LENGTH")
-            local take = reaper.GetActiveTake(item)
-            local item_info = {
-                position = pos,
-                length = len,
-                is_midi = false,
-                note_count = 0
-            }
-            if take then
-                item_info.is_midi = reaper.TakeIsMIDI(take)
-                if item_info.is_midi then
-                    local _, note_count = reaper.MIDI_CountEvts(take)
-                    item_info.note_count = note_count
-                end
-            end
-            table.insert(items_info, item_info)
+        local info = { index = i }
+        for field, get in pairs(track_fields) do
+            info[field] = get(track)
         end
-
-        local db = 20 * math.log(vol, 10)
-
-        table.insert(state.tracks, {
-            index = i,
-            name = name,
-            volume_db = math.floor(db * 10 + 0.5) / 10,
-            volume_linear = vol,
-            pan = pan,
-            mute = mute == 1,
-            solo = solo > 0,
-            armed = armed == 1,
-            num_items = num_items,
-            items = items_info,
-            fx = fx_list,
-        })
+        table.insert(state.tracks, info)
     end
 
     -- Markers and regions
@@ -630,6 +743,7 @@ end
 local server = nil
 local client = nil
 local recv_buffer = ""
+local framing = "newline"  -- or "length" after a hello handshake
 
 local function start_server()
     local err
@@ -646,7 +760,12 @@ end
 
 local function send_response(response)
     if not client then return end
-    local data = json.encode(response) .. "\n"
+    local data = json.encode(response)
+    if framing == "length" then
+        data = string.pack(">s4", data)
+    else
+        data = data .. "\n"
+    end
     local ok, err = client:send(data)
     if not ok then
         reaper.ShowConsoleMsg("[reaper-mcp] Send error: " .. tostring(err) .. "\n")
@@ -690,6 +809,7 @@ local function poll()
             new_client:settimeout(0)
             client = new_client
             recv_buffer = ""
+            framing = "newline"
             reaper.ShowConsoleMsg("[reaper-mcp] Client connected\n")
         end
     end
@@ -702,17 +822,39 @@ local function poll()
         if received and #received > 0 then
             recv_buffer = recv_buffer .. received
 
-            -- Process complete messages (newline-delimited)
-            while true do
-                local nl = recv_buffer:find("\n")
-                if not nl then break end
-
-                local msg = recv_buffer:sub(1, nl - 1)
-                recv_buffer = recv_buffer:sub(nl + 1)
+            -- Process complete messages (newline-delimited or length-prefixed)
+            while client do
+                local msg
+                if framing == "length" then
+                    if #recv_buffer < 4 then break end
+                    local size = string.unpack(">I4", recv_buffer)
+                    if size > MAX_MSG_SIZE then
+                        -- Can't skip the body reliably, so drop the client
+                        reaper.ShowConsoleMsg("[reaper-mcp] Message too large, disconnecting\n")
+                        send_response({ error = { message = "Message too large" }, id = nil })
+                        if client then client:close() end
+                        client = nil
+                        recv_buffer = ""
+                        framing = "newline"
+                        break
+                    end
+                    if #recv_buffer < 4 + size then break end
+                    msg = recv_buffer:sub(5, 4 + size)
+                    recv_buffer = recv_buffer:sub(5 + size)
+                else
+                    local nl = recv_buffer:find("\n")
+                    if not nl then break end
+                    msg = recv_buffer:sub(1, nl - 1)
+                    recv_buffer = recv_buffer:sub(nl + 1)
+                end
 
                 if #msg > 0 then
                     local response = handle_message(msg)
                     send_response(response)
+                    if requested_framing then
+                        framing = requested_framing
+                        requested_framing = nil
+                    end
                 end
             end
 
@@ -724,11 +866,12 @@ local function poll()
             end
         end
 
-        if err == "closed" then
+        if client and err == "closed" then
             reaper.ShowConsoleMsg("[reaper-mcp] Client disconnected\n")
             client:close()
             client = nil
             recv_buffer = ""
+            framing = "newline"
         end
     end
 
@@ -745,7 +888,7 @@ local bind_attempt = 0
 local function main()
     reaper.ShowConsoleMsg("\n")
     reaper.ShowConsoleMsg("===========================================\n")
-    reaper.ShowConsoleMsg("  reaper-mcp bridge v0.1.0\n")
+    reaper.ShowConsoleMsg("  reaper-mcp bridge v" .. BRIDGE_VERSION .. "\n")
     reaper.ShowConsoleMsg("===========================================\n")
 
     local function try_start()
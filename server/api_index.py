@@ -1,13 +1,21 @@
 """ReaScript API documentation parser and search index."""
 
+import functools
+import io
 import os
 import re
 import sqlite3
 import logging
+import threading
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from html.parser import HTMLParser
 
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # optional: pip install reaper-ai-tools[fast]
+    lxml_etree = None
+
 logger = logging.getLogger(__name__)
 
 DB_DIR = os.path.join(os.path.expanduser("~"), ".reaper-mcp")
@@ -16,9 +24,10 @@ DB_PATH = os.path.join(DB_DIR, "api_index.db")
 # Bundled docs location
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 DOCS_PATH = os.path.join(DATA_DIR, "reascripthelp.html")
+_READ_CHUNK = 64 * 1024
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class APIFunction:
     name: str
     signature: str
@@ -41,8 +50,10 @@ class ReaScriptHTMLParser(HTMLParser):
         self._code_text = ""
         self._desc_parts: List[str] = []
         self._current_data: List[str] = []
+        self._pending_text: List[str] = []
 
     def handle_starttag(self, tag, attrs):
+        self._flush_text()
         attr_dict = dict(attrs)
         if tag == "a" and "name" in attr_dict:
             # New function anchor
@@ -67,6 +78,7 @@ class ReaScriptHTMLParser(HTMLParser):
             self._current_data = []
 
     def handle_endtag(self, tag):
+        self._flush_text()
         if tag == "code" and self._in_code:
             self._in_code = False
             self._code_text = "".join(self._current_data).strip()
@@ -77,6 +89,18 @@ class ReaScriptHTMLParser(HTMLParser):
                 self._capture_desc = True
 
     def handle_data(self, data):
+        # A text node can arrive in pieces when the document is fed in
+        # chunks, so hold it until the next tag
+        self._pending_text.append(data)
+
+    def handle_comment(self, data):
+        self._flush_text()
+
+    def _flush_text(self):
+        if not self._pending_text:
+            return
+        data = "".join(self._pending_text)
+        self._pending_text = []
         if self._in_code:
             self._current_data.append(data)
         elif self._capture_desc and self._current_func_name:
@@ -93,37 +117,97 @@ class ReaScriptHTMLParser(HTMLParser):
             })
 
     def close(self):
+        super().close()
+        self._flush_text()
         if self._current_func_name and self._code_text:
             self._save_current()
-        super().close()
+
+
+class _LxmlTarget:
+    """lxml parser target that drives ReaScriptHTMLParser's state machine.
+
+    Tokenizing happens in libxml2; only the tag/data callbacks run in Python.
+    """
+
+    def __init__(self, handler: ReaScriptHTMLParser):
+        self._handler = handler
+
+    def start(self, tag, attrib):
+        self._handler.handle_starttag(tag, list(attrib.items()))
+
+    def end(self, tag):
+        self._handler.handle_endtag(tag)
+
+    def data(self, data):
+        self._handler.handle_data(data)
+
+    def comment(self, text):
+        self._handler.handle_comment(text)
+
+    def close(self):
+        self._handler.close()
+        return self._handler.functions
+
+
+class LxmlReaScriptParser:
+    """Drop-in for ReaScriptHTMLParser backed by lxml's C HTML parser."""
+
+    def __init__(self):
+        self._handler = ReaScriptHTMLParser()
+        self._parser = lxml_etree.HTMLParser(target=_LxmlTarget(self._handler))
+
+    @property
+    def functions(self) -> List[dict]:
+        return self._handler.functions
+
+    def feed(self, data: str) -> None:
+        self._parser.feed(data)
+
+    def close(self) -> None:
+        self._parser.close()
+
+
+def _make_docs_parser():
+    """Fastest available reascripthelp.html parser (lxml, else pure Python)."""
+    if lxml_etree is not None:
+        return LxmlReaScriptParser()
+    return ReaScriptHTMLParser()
+
+
+# Name prefix -> category. Order matters: the first prefix that matches
+# (optionally after "Get"/"Set") wins, so "TrackFX_*" lands in "Tracks".
+_CATEGORY_PREFIXES = {
+    "MIDI": "MIDI",
+    "Track": "Tracks",
+    "FX": "FX",
+    "TrackFX": "FX",
+    "TakeFX": "FX",
+    "Item": "Items",
+    "Take": "Takes",
+    "Env": "Envelopes",
+    "Marker": "Markers",
+    "Project": "Project",
+    "Master": "Master",
+    "Audio": "Audio",
+    "CF_": "SWS",
+    "BR_": "SWS",
+    "SNM_": "SWS",
+    "NF_": "SWS",
+    "JS_": "JS Extension",
+    "ImGui_": "ImGui",
+}
+_CATEGORY_RE = re.compile(
+    r"^(?:Get|Set)?(" + "|".join(map(re.escape, _CATEGORY_PREFIXES)) + ")"
+)
+_SIG_RE = re.compile(r'^([\w\s,]*?)\s*(\w+)\s*\((.*)\)$')
 
 
 def _infer_category(name: str) -> str:
     """Infer a category from the function name."""
-    prefixes = {
-        "MIDI": "MIDI",
-        "Track": "Tracks",
-        "FX": "FX",
-        "TrackFX": "FX",
-        "TakeFX": "FX",
-        "Item": "Items",
-        "Take": "Takes",
-        "Env": "Envelopes",
-        "Marker": "Markers",
-        "Project": "Project",
-        "Master": "Master",
-        "Audio": "Audio",
-        "CF_": "SWS",
-        "BR_": "SWS",
-        "SNM_": "SWS",
-        "NF_": "SWS",
-        "JS_": "JS Extension",
-        "ImGui_": "ImGui",
-    }
-    for prefix, category in prefixes.items():
-        if name.startswith(prefix) or name.startswith("Get" + prefix) or name.startswith("Set" + prefix):
-            return category
-    if name.startswith("Get") or name.startswith("Set"):
+    match = _CATEGORY_RE.match(name)
+    if match:
+        return _CATEGORY_PREFIXES[match.group(1)]
+    if name.startswith(("Get", "Set")):
         return "General"
     return "Other"
 
@@ -134,25 +218,126 @@ def _parse_signature(sig: str) -> tuple:
     sig = sig.replace("reaper.", "")
 
     # Try to extract return type, name, params
-    match = re.match(r'^([\w\s,]*?)\s*(\w+)\s*\((.*)\)$', sig)
+    match = _SIG_RE.match(sig)
     if match:
         ret = match.group(1).strip()
-        name = match.group(2).strip()
         params = match.group(3).strip()
         return ret or "void", params
     return "void", ""
 
 
+# Keep api_fts in sync with api_functions. build_index drops these for the
+# bulk load and rebuilds the FTS index in one pass instead. api_au only
+# watches the indexed columns: mark_available flipping the flag on hundreds
+# of rows must not re-index each one.
+_FTS_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS api_ai AFTER INSERT ON api_functions BEGIN
+        INSERT INTO api_fts(rowid, name, signature, description, category)
+        VALUES (new.rowid, new.name, new.signature, new.description, new.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_ad AFTER DELETE ON api_functions BEGIN
+        INSERT INTO api_fts(api_fts, rowid, name, signature, description, category)
+        VALUES('delete', old.rowid, old.name, old.signature, old.description, old.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_au
+    AFTER UPDATE OF name, signature, description, category ON api_functions BEGIN
+        INSERT INTO api_fts(api_fts, rowid, name, signature, description, category)
+        VALUES('delete', old.rowid, old.name, old.signature, old.description, old.category);
+        INSERT INTO api_fts(rowid, name, signature, description, category)
+        VALUES (new.rowid, new.name, new.signature, new.description, new.category);
+    END
+    """,
+)
+
+# Keep api_names (trigram index over names) in step with api_functions. Only
+# a name change touches it, so mark_available's flag updates skip it.
+_NAME_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS api_names_ai AFTER INSERT ON api_functions BEGIN
+        INSERT INTO api_names(rowid, name) VALUES (new.rowid, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_names_ad AFTER DELETE ON api_functions BEGIN
+        INSERT INTO api_names(api_names, rowid, name) VALUES('delete', old.rowid, old.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_names_au AFTER UPDATE OF name ON api_functions BEGIN
+        INSERT INTO api_names(api_names, rowid, name) VALUES('delete', old.rowid, old.name);
+        INSERT INTO api_names(rowid, name) VALUES (new.rowid, new.name);
+    END
+    """,
+)
+
+
+def _apply_pragmas(conn: sqlite3.Connection) -> None:
+    """Tune a fresh connection: WAL so searches don't block on a rebuild,
+    no full fsync per transaction (the index can always be rebuilt), and
+    the file mapped so searches read pages without a copy."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA mmap_size=268435456")
+
+
 class APIIndex:
     """SQLite FTS5-based API documentation search."""
 
+    # Constant, fully parameterized SQL so sqlite3's statement cache is hit
+    _SEARCH_SQL = """
+        SELECT f.name, f.signature, f.description,
+               f.return_type, f.params, f.category
+        FROM api_fts
+        JOIN api_functions f ON f.rowid = api_fts.rowid
+        WHERE api_fts MATCH ?
+        ORDER BY rank LIMIT ?
+    """
+    _SEARCH_AVAILABLE_SQL = """
+        SELECT f.name, f.signature, f.description,
+               f.return_type, f.params, f.category
+        FROM api_fts
+        JOIN api_functions f ON f.rowid = api_fts.rowid
+        WHERE api_fts MATCH ? AND f.available = ?
+        ORDER BY rank LIMIT ?
+    """
+    # Substring fallback over names; api_names uses the trigram tokenizer
+    _NAME_SEARCH_SQL = """
+        SELECT f.name, f.signature, f.description,
+               f.return_type, f.params, f.category
+        FROM api_names
+        JOIN api_functions f ON f.rowid = api_names.rowid
+        WHERE api_names MATCH ? AND (f.available = 1 OR NOT ?)
+        ORDER BY rank LIMIT ?
+    """
+
     def __init__(self, db_path: Optional[str] = None):
         self.db_path = db_path or DB_PATH
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_lock = threading.RLock()
+        # Bumped on every write; part of the search cache key so stale
+        # results are never served after build_index/mark_available
+        self._version = 0
+        self._search_cached = functools.lru_cache(maxsize=256)(self._search)
         self._init_db()
 
     def _init_db(self):
-        with self._connect() as conn:
+        conn = self._connect()
+        with self._conn_lock:
+            # Databases from before api_au was limited to the indexed columns
+            row = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'api_au'"
+            ).fetchone()
+            if row is not None and "UPDATE OF" not in row[0]:
+                conn.execute("DROP TRIGGER api_au")
             conn.executescript("""
                 CREATE TABLE IF NOT EXISTS api_functions (
                     name TEXT PRIMARY KEY,
@@ -170,32 +355,67 @@ class APIIndex:
                     content_rowid='rowid'
                 );
 
-                CREATE TRIGGER IF NOT EXISTS api_ai AFTER INSERT ON api_functions BEGIN
-                    INSERT INTO api_fts(rowid, name, signature, description, category)
-                    VALUES (new.rowid, new.name, new.signature, new.description, new.category);
-                END;
-
-                CREATE TRIGGER IF NOT EXISTS api_ad AFTER DELETE ON api_functions BEGIN
-                    INSERT INTO api_fts(api_fts, rowid, name, signature, description, category)
-                    VALUES('delete', old.rowid, old.name, old.signature, old.description, old.category);
-                END;
-
-                CREATE TRIGGER IF NOT EXISTS api_au AFTER UPDATE ON api_functions BEGIN
-                    INSERT INTO api_fts(api_fts, rowid, name, signature, description, category)
-                    VALUES('delete', old.rowid, old.name, old.signature, old.description, old.category);
-                    INSERT INTO api_fts(rowid, name, signature, description, category)
-                    VALUES (new.rowid, new.name, new.signature, new.description, new.category);
-                END;
-            """)
+                -- Lets list_categories group and sum from the index alone
+                CREATE INDEX IF NOT EXISTS idx_cat_avail
+                    ON api_functions(category, available);
+            """ + ";\n".join(_FTS_TRIGGERS) + ";")
+            self._trigram = self._init_name_index(conn)
+
+    def _init_name_index(self, conn: sqlite3.Connection) -> bool:
+        """Create api_names, the trigram index behind substring search.
+
+        Returns False if this SQLite has no trigram tokenizer (before 3.34);
+        search then goes without the substring fallback.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'api_names'").fetchone()
+        if not exists:
+            try:
+                conn.execute("""
+                    CREATE VIRTUAL TABLE api_names USING fts5(
+                        name,
+                        content='api_functions',
+                        content_rowid='rowid',
+                        tokenize='trigram'
+                    )
+                """)
+            except sqlite3.OperationalError:
+                return False
+            # Databases indexed before api_names existed
+            conn.execute("INSERT INTO api_names(api_names) VALUES('rebuild')")
+        for ddl in _NAME_TRIGGERS:
+            conn.execute(ddl)
+        conn.commit()
+        return True
 
     def _connect(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
+        """Return the shared connection, opening it on first use.
+
+        FastMCP may call in from worker threads, so the connection is not
+        bound to the creating thread; writers hold ``_conn_lock``.
+        """
+        if self._conn is None:
+            with self._conn_lock:
+                if self._conn is None:
+                    conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                    _apply_pragmas(conn)
+                    self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """Close the shared connection. It is reopened on next use, except
+        that an in-memory (":memory:") index is gone."""
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.execute("PRAGMA optimize")
+                self._conn.close()
+                self._conn = None
 
     @property
     def is_indexed(self) -> bool:
         """Check if the index has been populated."""
-        with self._connect() as conn:
-            count = conn.execute("SELECT COUNT(*) FROM api_functions").fetchone()[0]
+        conn = self._connect()
+        count = conn.execute("SELECT COUNT(*) FROM api_functions").fetchone()[0]
         return count > 0
 
     def build_index(self, html_path: Optional[str] = None) -> int:
@@ -205,91 +425,140 @@ class APIIndex:
             logger.warning(f"API docs not found at {html_path}")
             return 0
 
-        with open(html_path, "r", encoding="utf-8", errors="replace") as f:
-            html = f.read()
-
-        parser = ReaScriptHTMLParser()
-        parser.feed(html)
+        # Stream the docs through the parser rather than holding the whole
+        # file in memory alongside the parser state
+        parser = _make_docs_parser()
+        with open(html_path, "rb") as raw, \
+                io.TextIOWrapper(raw, encoding="utf-8", errors="replace") as f:
+            for chunk in iter(lambda: f.read(_READ_CHUNK), ""):
+                parser.feed(chunk)
         parser.close()
 
-        with self._connect() as conn:
-            # Clear existing
-            conn.execute("DELETE FROM api_functions")
-            conn.execute("DELETE FROM api_fts")
-
-            for func in parser.functions:
-                ret_type, params = _parse_signature(func["signature"])
-                category = _infer_category(func["name"])
-                conn.execute("""
-                    INSERT OR REPLACE INTO api_functions
+        # Keyed by name so a function documented twice keeps its last entry,
+        # matching what INSERT OR REPLACE used to do
+        rows = {}
+        for func in parser.functions:
+            ret_type, params = _parse_signature(func["signature"])
+            rows[func["name"]] = (func["name"], func["signature"], func["description"],
+                                  ret_type, params, _infer_category(func["name"]))
+
+        conn = self._connect()
+        with self._conn_lock:
+            try:
+                # One transaction and one prepared statement for the whole build.
+                # Triggers are dropped so rows don't hit api_fts one at a time;
+                # the FTS index is rebuilt once at the end.
+                conn.execute("BEGIN")
+                for trigger in ("api_ai", "api_ad", "api_au",
+                                "api_names_ai", "api_names_ad", "api_names_au"):
+                    conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+                conn.execute("DELETE FROM api_functions")
+                conn.executemany("""
+                    INSERT INTO api_functions
                     (name, signature, description, return_type, params, category)
                     VALUES (?, ?, ?, ?, ?, ?)
-                """, (func["name"], func["signature"], func["description"],
-                      ret_type, params, category))
-
-        logger.info(f"Indexed {len(parser.functions)} API functions")
-        return len(parser.functions)
+                """, rows.values())
+                conn.execute("INSERT INTO api_fts(api_fts) VALUES('rebuild')")
+                for ddl in _FTS_TRIGGERS:
+                    conn.execute(ddl)
+                if self._trigram:
+                    conn.execute("INSERT INTO api_names(api_names) VALUES('rebuild')")
+                    for ddl in _NAME_TRIGGERS:
+                        conn.execute(ddl)
+                conn.commit()
+                self._version += 1
+            except Exception:
+                conn.rollback()
+                raise
+
+        logger.info(f"Indexed {len(rows)} API functions")
+        return len(rows)
 
     def mark_available(self, function_names: List[str]) -> None:
         """Mark functions as available on the user's REAPER install."""
-        with self._connect() as conn:
-            conn.execute("UPDATE api_functions SET available = 0")
-            for name in function_names:
-                conn.execute(
-                    "UPDATE api_functions SET available = 1 WHERE name = ?",
-                    (name,)
+        conn = self._connect()
+        with self._conn_lock, conn:
+            # Stage the names once, then let SQLite do the set operations
+            conn.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS avail (
+                    name TEXT PRIMARY KEY,
+                    category TEXT
                 )
+            """)
+            conn.execute("DELETE FROM temp.avail")
+            conn.executemany(
+                "INSERT OR IGNORE INTO temp.avail (name, category) VALUES (?, ?)",
+                ((name, _infer_category(name)) for name in function_names)
+            )
+            # Only touch rows whose flag changes, so the FTS trigger fires less
+            conn.execute("""
+                UPDATE api_functions
+                SET available = (name IN (SELECT name FROM temp.avail))
+                WHERE available IS NOT (name IN (SELECT name FROM temp.avail))
+            """)
             # Add runtime-only functions not in static docs
-            for name in function_names:
-                existing = conn.execute(
-                    "SELECT name FROM api_functions WHERE name = ?", (name,)
-                ).fetchone()
-                if not existing:
-                    category = _infer_category(name)
-                    conn.execute("""
-                        INSERT INTO api_functions
-                        (name, signature, description, return_type, params, category, available)
-                        VALUES (?, ?, ?, ?, ?, ?, 1)
-                    """, (name, f"reaper.{name}(...)", "Undocumented (extension function)",
-                          "unknown", "unknown", category))
+            conn.execute("""
+                INSERT INTO api_functions
+                (name, signature, description, return_type, params, category, available)
+                SELECT a.name, 'reaper.' || a.name || '(...)',
+                       'Undocumented (extension function)', 'unknown', 'unknown',
+                       a.category, 1
+                FROM temp.avail a
+                LEFT JOIN api_functions f ON f.name = a.name
+                WHERE f.name IS NULL
+            """)
+            conn.execute("DELETE FROM temp.avail")
+            self._version += 1
 
     def search(self, query: str, limit: int = 20, available_only: bool = False) -> List[APIFunction]:
-        """Full-text search across function names, signatures, and descriptions."""
-        with self._connect() as conn:
-            # FTS5 query — escape special chars
-            fts_query = re.sub(r'[^\w\s]', ' ', query).strip()
-            if not fts_query:
-                return []
-
-            # Search with FTS5, adding wildcards for partial matches
-            terms = fts_query.split()
-            fts_expr = " OR ".join(f'"{t}"*' for t in terms)
-
-            sql = """
-                SELECT f.name, f.signature, f.description,
-                       f.return_type, f.params, f.category
-                FROM api_functions f
-                JOIN api_fts ON f.rowid = api_fts.rowid
-                WHERE api_fts MATCH ?
-            """
-            if available_only:
-                sql += " AND f.available = 1"
-            sql += f" ORDER BY rank LIMIT {limit}"
-
-            rows = conn.execute(sql, (fts_expr,)).fetchall()
-
-        return [APIFunction(
+        """Full-text search across function names, signatures, and descriptions.
+
+        Words match as prefixes. If nothing matches, words of three or more
+        characters are looked up anywhere inside function names instead
+        ("NoteName" finds GetTrackMIDINoteName).
+        """
+        query_norm = " ".join(query.lower().split())
+        return list(self._search_cached(query_norm, limit, available_only, self._version))
+
+    def _search(self, query: str, limit: int, available_only: bool,
+                version: int) -> Tuple[APIFunction, ...]:
+        # FTS5 query — escape special chars
+        fts_query = re.sub(r'[^\w\s]', ' ', query).strip()
+        if not fts_query:
+            return ()
+
+        # Search with FTS5, adding wildcards for partial matches
+        terms = fts_query.split()
+        fts_expr = " OR ".join(f'"{t}"*' for t in terms)
+
+        if available_only:
+            rows = self._connect().execute(
+                self._SEARCH_AVAILABLE_SQL, (fts_expr, 1, limit)
+            ).fetchall()
+        else:
+            rows = self._connect().execute(
+                self._SEARCH_SQL, (fts_expr, limit)
+            ).fetchall()
+
+        if not rows and self._trigram:
+            substrings = [t for t in terms if len(t) >= 3]
+            if substrings:
+                rows = self._connect().execute(
+                    self._NAME_SEARCH_SQL,
+                    (" OR ".join(f'"{t}"' for t in substrings), available_only, limit)
+                ).fetchall()
+
+        return tuple(APIFunction(
             name=r[0], signature=r[1], description=r[2],
             return_type=r[3], params=r[4], category=r[5]
-        ) for r in rows]
+        ) for r in rows)
 
     def get_function(self, name: str) -> Optional[APIFunction]:
         """Get a specific function by exact name."""
-        with self._connect() as conn:
-            row = conn.execute("""
-                SELECT name, signature, description, return_type, params, category
-                FROM api_functions WHERE name = ?
-            """, (name,)).fetchone()
+        row = self._connect().execute("""
+            SELECT name, signature, description, return_type, params, category
+            FROM api_functions WHERE name = ?
+        """, (name,)).fetchone()
 
         if not row:
             return None
@@ -300,14 +569,13 @@ class APIIndex:
 
     def list_categories(self) -> List[dict]:
         """List all categories with function counts."""
-        with self._connect() as conn:
-            rows = conn.execute("""
-                SELECT category, COUNT(*) as count,
-                       SUM(available) as available_count
-                FROM api_functions
-                GROUP BY category
-                ORDER BY count DESC
-            """).fetchall()
+        rows = self._connect().execute("""
+            SELECT category, COUNT(*) as count,
+                   SUM(available) as available_count
+            FROM api_functions
+            GROUP BY category
+            ORDER BY count DESC
+        """).fetchall()
 
         return [{"category": r[0], "total": r[1], "available": r[2]} for r in rows]
 
@@ -1,10 +1,18 @@
 """TCP socket connection to REAPER's Lua bridge."""
 
 import asyncio
+import itertools
 import json
 import os
 import logging
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from server.helpers import lua_literal
+
+try:
+    import orjson
+except ImportError:  # optional: pip install reaper-ai-tools[fast]
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
@@ -15,22 +23,56 @@ RECONNECT_DELAY = 1.0
 RECONNECT_MAX_DELAY = 10.0
 
 
+if orjson is not None:
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def _loads(data: bytes) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # The bridge encodes +/-inf (e.g. a -inf dB track) as 1e999,
+            # which orjson rejects but the stdlib parses as a float
+            return json.loads(data)
+else:
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    _loads = json.loads
+
+
 class ConnectionError(Exception):
     """Failed to connect or communicate with REAPER."""
     pass
 
 
 class ReaperConnection:
-    """Async TCP client for communicating with REAPER's Lua bridge."""
+    """Async TCP client for communicating with REAPER's Lua bridge.
+
+    Requests are pipelined: each one registers a future under its id and a
+    single background reader task resolves futures as responses arrive, so
+    concurrent tool calls don't wait for each other's round trips.
+
+    On connect a ``hello`` handshake asks the bridge for 4-byte big-endian
+    length-prefixed framing; bridges that predate it reply with an
+    unknown-method error and the connection stays newline-delimited.
+    """
 
     def __init__(self, host: str = "127.0.0.1", port: Optional[int] = None):
         self.host = host
         self.port = port or int(os.getenv("REAPER_MCP_PORT", str(DEFAULT_PORT)))
         self._reader: Optional[asyncio.StreamReader] = None
         self._writer: Optional[asyncio.StreamWriter] = None
-        self._request_id = 0
-        self._lock = asyncio.Lock()
+        self._next_id = itertools.count(1).__next__
+        self._write_lock = asyncio.Lock()
+        self._connect_lock = asyncio.Lock()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._reader_task: Optional[asyncio.Task] = None
+        self._framed = False
         self._connected = False
+        # exec_cached keys whose source the bridge has from this connection
+        self._cached_sources: Dict[str, str] = {}
+        self._exec_cached = True
 
     @property
     def connected(self) -> bool:
@@ -38,14 +80,20 @@ class ReaperConnection:
 
     async def connect(self) -> None:
         """Connect to REAPER. Raises ConnectionError if it fails."""
+        if self._writer is not None:
+            await self.disconnect()
         try:
             self._reader, self._writer = await asyncio.wait_for(
                 asyncio.open_connection(self.host, self.port),
                 timeout=CONNECT_TIMEOUT
             )
+            self._framed = await self._negotiate_framing()
+            self._cached_sources = {}
+            self._exec_cached = True
             self._connected = True
+            self._reader_task = asyncio.create_task(self._read_loop(self._reader))
             logger.info(f"Connected to REAPER at {self.host}:{self.port}")
-        except (OSError, asyncio.TimeoutError) as e:
+        except (OSError, asyncio.TimeoutError, ValueError) as e:
             self._connected = False
             raise ConnectionError(
                 f"Cannot connect to REAPER at {self.host}:{self.port}. "
@@ -54,6 +102,9 @@ class ReaperConnection:
 
     async def disconnect(self) -> None:
         """Close the connection."""
+        if self._reader_task and self._reader_task is not asyncio.current_task():
+            self._reader_task.cancel()
+        self._reader_task = None
         if self._writer:
             try:
                 self._writer.close()
@@ -63,11 +114,79 @@ class ReaperConnection:
         self._writer = None
         self._reader = None
         self._connected = False
+        self._fail_pending(ConnectionError("Connection closed"))
 
     async def ensure_connected(self) -> None:
         """Connect if not already connected."""
         if not self.connected:
-            await self.connect()
+            async with self._connect_lock:
+                if not self.connected:
+                    await self.connect()
+
+    async def _negotiate_framing(self) -> bool:
+        """Run the hello handshake. Returns True if length framing was accepted."""
+        hello = {"method": "hello", "params": {"framing": "length"}, "id": self._next_id()}
+        self._writer.write(_dumps(hello) + b"\n")
+        await self._writer.drain()
+
+        line = await asyncio.wait_for(self._reader.readline(), timeout=CONNECT_TIMEOUT)
+        if not line:
+            raise OSError("connection closed during handshake")
+        result = _loads(line).get("result") or {}
+        return result.get("framing") == "length"
+
+    def _frame(self, body: bytes) -> bytes:
+        if self._framed:
+            return len(body).to_bytes(4, "big") + body
+        return body + b"\n"
+
+    async def _read_message(self, reader: asyncio.StreamReader) -> bytes:
+        if self._framed:
+            header = await reader.readexactly(4)
+            return await reader.readexactly(int.from_bytes(header, "big"))
+        line = await reader.readline()
+        if not line:
+            raise asyncio.IncompleteReadError(line, None)
+        return line
+
+    def _fail_pending(self, exc: Exception) -> None:
+        """Fail every in-flight request with ``exc``."""
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        """Dispatch responses to waiting requests by id until the socket drops."""
+        try:
+            while True:
+                try:
+                    data = await self._read_message(reader)
+                except asyncio.IncompleteReadError:
+                    raise ConnectionError("Connection closed by REAPER")
+
+                response = _loads(data)
+                future = self._pending.pop(response.get("id"), None)
+                if future is not None:
+                    if not future.done():
+                        future.set_result(response)
+                elif response.get("id") is None and response.get("error"):
+                    # The bridge couldn't tell which request failed (e.g. it
+                    # dropped an oversized buffer); everything in flight is lost
+                    error = response["error"]
+                    message = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+                    self._fail_pending(ConnectionError(message))
+                else:
+                    # Late reply to a request that already timed out
+                    logger.debug(f"Dropping response for unknown id {response.get('id')}")
+        except asyncio.CancelledError:
+            raise
+        except (OSError, ValueError, ConnectionError) as e:
+            if reader is self._reader:
+                self._connected = False
+            if not isinstance(e, ConnectionError):
+                e = ConnectionError(f"Communication error: {e}")
+            self._fail_pending(e)
 
     async def request(self, method: str, params: Optional[dict] = None,
                       timeout: Optional[float] = None) -> Any:
@@ -75,51 +194,69 @@ class ReaperConnection:
 
         Returns the result on success, raises on error.
         """
-        await self.ensure_connected()
+        (response,) = await self._roundtrip([(method, params)], timeout)
+        return self._result(response)
 
-        self._request_id += 1
-        request_id = self._request_id
-        timeout = timeout or REQUEST_TIMEOUT
+    async def request_many(self, calls: Sequence[Tuple[str, Optional[dict]]],
+                           timeout: Optional[float] = None) -> List[Any]:
+        """Send several (method, params) requests in one write.
 
-        msg = {
-            "method": method,
-            "params": params or {},
-            "id": request_id
-        }
+        Returns their results in order; raises if any of them errored.
+        """
+        if not calls:
+            return []
+        responses = await self._roundtrip(calls, timeout)
+        return [self._result(response) for response in responses]
 
-        async with self._lock:
-            try:
-                data = json.dumps(msg) + "\n"
-                self._writer.write(data.encode("utf-8"))
+    async def _roundtrip(self, calls: Sequence[Tuple[str, Optional[dict]]],
+                         timeout: Optional[float]) -> List[dict]:
+        await self.ensure_connected()
+
+        timeout = timeout or REQUEST_TIMEOUT
+        loop = asyncio.get_running_loop()
+        frames = []
+        futures = {}
+        for method, params in calls:
+            request_id = self._next_id()
+            msg = {
+                "method": method,
+                "params": params or {},
+                "id": request_id
+            }
+            frames.append(self._frame(_dumps(msg)))
+            futures[request_id] = loop.create_future()
+
+        self._pending.update(futures)
+        try:
+            async with self._write_lock:
+                self._writer.write(b"".join(frames))
                 await self._writer.drain()
 
-                line = await asyncio.wait_for(
-                    self._reader.readline(),
-                    timeout=timeout
-                )
+            return await asyncio.wait_for(
+                asyncio.gather(*futures.values()), timeout=timeout)
 
-                if not line:
-                    self._connected = False
-                    raise ConnectionError("Connection closed by REAPER")
+        except asyncio.TimeoutError:
+            methods = ", ".join(method for method, _ in calls)
+            raise ConnectionError(
+                f"Request timed out after {timeout}s. "
+                f"Method: {methods}"
+            )
+        except OSError as e:
+            self._connected = False
+            raise ConnectionError(f"Communication error: {e}") from e
+        finally:
+            for request_id in futures:
+                self._pending.pop(request_id, None)
 
-                response = json.loads(line.decode("utf-8"))
+    @staticmethod
+    def _result(response: dict) -> Any:
+        if "error" in response and response["error"]:
+            error = response["error"]
+            if isinstance(error, dict):
+                raise ConnectionError(error.get("message", str(error)))
+            raise ConnectionError(str(error))
 
-                if "error" in response and response["error"]:
-                    error = response["error"]
-                    if isinstance(error, dict):
-                        raise ConnectionError(error.get("message", str(error)))
-                    raise ConnectionError(str(error))
-
-                return response.get("result")
-
-            except asyncio.TimeoutError:
-                raise ConnectionError(
-                    f"Request timed out after {timeout}s. "
-                    f"Method: {method}"
-                )
-            except (OSError, json.JSONDecodeError) as e:
-                self._connected = False
-                raise ConnectionError(f"Communication error: {e}") from e
+        return response.get("result")
 
     async def ping(self) -> bool:
         """Check if REAPER is responsive."""
@@ -154,6 +291,59 @@ class ReaperConnection:
 
         return await self.request("exec", params, timeout=socket_timeout)
 
+    async def execute_batch(self, codes: Sequence[str],
+                            undo_label: Optional[str] = None) -> List[dict]:
+        """Execute several Lua scripts with one write to the bridge.
+
+        The bridge runs them in order, each as its own undo step. Returns
+        one execute()-style result dict per script.
+        """
+        params = {"undo_label": undo_label} if undo_label else {}
+        # Same budget as execute()'s default, per script
+        return await self.request_many(
+            [("exec", {"code": code, **params}) for code in codes],
+            timeout=120.0 * len(codes) + 30.0)
+
+    async def execute_cached(self, key: str, code: str, args: Any = None,
+                             undo_label: Optional[str] = None,
+                             timeout_ms: Optional[int] = None) -> dict:
+        """Execute a Lua script that the bridge keeps compiled under ``key``.
+
+        The source only travels the first time a key is used on a connection
+        (or when it changes); after that the request carries the key and
+        ``args``, which the script receives as ``...``. Bridges without
+        exec_cached get the same script through a plain exec.
+
+        Returns the same dict as execute().
+        """
+        params: Dict[str, Any] = {"key": key}
+        if args is not None:
+            params["args"] = args
+        if undo_label:
+            params["undo_label"] = undo_label
+        if timeout_ms is not None:
+            params["timeout_ms"] = timeout_ms
+        socket_timeout = (timeout_ms or 120000) / 1000.0 + 30.0
+
+        if self._exec_cached:
+            try:
+                if self._cached_sources.get(key) == code:
+                    result = await self.request("exec_cached", params, timeout=socket_timeout)
+                    if not (isinstance(result, dict) and result.get("missing")):
+                        return result
+                    # The bridge was reloaded behind this connection
+                result = await self.request("exec_cached", {**params, "code": code},
+                                            timeout=socket_timeout)
+                self._cached_sources[key] = code
+                return result
+            except ConnectionError as e:
+                if "Unknown method" not in str(e):
+                    raise
+                self._exec_cached = False
+
+        wrapped = f"return (function(...)\n{code}\nend)({lua_literal(args)})"
+        return await self.execute(wrapped, undo_label=undo_label, timeout_ms=timeout_ms)
+
     async def startup(self, action: str = "status") -> dict:
         """Manage REAPER startup configuration for the MCP bridge."""
         return await self.request("startup", {"action": action})
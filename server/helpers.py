@@ -1,12 +1,27 @@
-"""Utility functions: dB conversion, track ref parsing."""
+"""Utility functions: dB conversion, track ref parsing, Lua literals."""
 
+import functools
 import math
-from typing import Union
+import re
+from bisect import bisect_right
+from typing import List, Optional, Tuple, Union
+
+
+# Whole-dB gains from -120 to +24, computed with the same formula as below.
+# Keyed by the dB value itself: -6 and -6.0 hash alike, so one dict probe
+# replaces the range and integer checks, and a miss costs little.
+_DB_LIN_MIN = -120
+_DB_LIN_MAX = 24
+_DB_LIN = {d: 10 ** (d / 20) for d in range(_DB_LIN_MIN, _DB_LIN_MAX + 1)}
+_db_lin_get = _DB_LIN.get
 
 
 def db_to_linear(db: float) -> float:
     """Convert dB to linear volume (0dB = 1.0)."""
-    return 10 ** (db / 20)
+    linear = _db_lin_get(db)
+    if linear is None:
+        return 10 ** (db / 20)
+    return linear
 
 
 def linear_to_db(linear: float) -> float:
@@ -16,6 +31,55 @@ def linear_to_db(linear: float) -> float:
     return 20 * math.log10(linear)
 
 
+# sign, number, optional dB suffix: "+3dB", "-6 dB", "0.5". Only the plain
+# forms; anything else ("-inf dB", "+1e1") goes through _parse_volume_loose
+_VOL_RE = re.compile(r"^([+-]?)(\d+(?:\.\d*)?|\.\d+)\s*(dB)?$", re.IGNORECASE)
+# side, amount (already upper-cased): "L50", "R30", "C"
+_PAN_RE = re.compile(r"^([LRC])?\s*(\d+(?:\.\d*)?|\.\d+)?$")
+
+
+def _numeric_volume(num: float) -> float:
+    if abs(num) > 1.0:
+        return db_to_linear(num)  # Treat as dB
+    return num  # Treat as linear
+
+
+# Volume strings repeat ("-6dB", "+3dB"), and the regex is most of the cost
+@functools.lru_cache(maxsize=256)
+def _parse_volume_str(value: str) -> Tuple[bool, float]:
+    """(True, dB offset) for a relative string, else (False, linear)."""
+    value = value.strip()
+    m = _VOL_RE.match(value)
+    if m is None:
+        return _parse_volume_loose(value)
+    sign, num_str, db_suffix = m.groups()
+    # Relative: "+3dB", "+3", "-3dB" (a bare "-6" stays absolute)
+    if sign == "+" or (sign == "-" and db_suffix):
+        return True, float(sign + num_str)
+    num = float(sign + num_str)
+    # Absolute dB: "0dB", "6dB"
+    if db_suffix:
+        return False, db_to_linear(num)
+    return False, _numeric_volume(num)
+
+
+def _parse_volume_loose(value: str) -> Tuple[bool, float]:
+    """_parse_volume_str for what _VOL_RE doesn't cover: exponents, "inf",
+    "nan". Any leading sign that isn't part of a plain negative number makes
+    the value relative, as in "-inf dB" (silence) and "+1e1" (+10 dB)."""
+    if value.startswith("+") or (
+            value.startswith("-") and not value.replace("-", "").replace(".", "").isdigit()):
+        try:
+            return True, float(value.lower().replace("db", "").strip())
+        except ValueError:
+            pass
+    # Absolute dB: "1e1dB"
+    if value.lower().endswith("db"):
+        return False, db_to_linear(float(value[:-2].strip()))
+    # float() raises on junk
+    return False, _numeric_volume(float(value))
+
+
 def parse_volume(value: Union[str, int, float, dict], current_linear: float = 1.0) -> float:
     """Parse a volume value into linear.
 
@@ -24,6 +88,9 @@ def parse_volume(value: Union[str, int, float, dict], current_linear: float = 1.
         - str: "-6dB", "+3dB", "-6", "0.5"
         - dict: {"db": -6}, {"linear": 0.5}, {"relative_db": -3}
     """
+    if isinstance(value, (int, float)):
+        return _numeric_volume(float(value))
+
     if isinstance(value, dict):
         if "db" in value:
             return db_to_linear(float(value["db"]))
@@ -35,33 +102,37 @@ def parse_volume(value: Union[str, int, float, dict], current_linear: float = 1.
         raise ValueError(f"Unknown volume dict format: {value}")
 
     if isinstance(value, str):
-        value = value.strip()
-        # Relative: "+3dB", "-3dB", "+3", "-3"
-        if value.startswith("+") or (value.startswith("-") and not value.replace("-", "").replace(".", "").isdigit()):
-            num_str = value.lower().replace("db", "").strip()
-            try:
-                relative_db = float(num_str)
-                current_db = linear_to_db(current_linear)
-                return db_to_linear(current_db + relative_db)
-            except ValueError:
-                pass
-
-        # Absolute dB: "-6dB", "0dB"
-        if value.lower().endswith("db"):
-            num_str = value[:-2].strip()
-            return db_to_linear(float(num_str))
-
-        # Numeric string
-        num = float(value)
-        if abs(num) > 1.0:
-            return db_to_linear(num)  # Treat as dB
-        return num  # Treat as linear
+        relative, num = _parse_volume_str(value)
+        if relative:
+            return db_to_linear(linear_to_db(current_linear) + num)
+        return num
 
     # Numeric
-    num = float(value)
-    if abs(num) > 1.0:
-        return db_to_linear(num)
-    return num
+    return _numeric_volume(float(value))
+
+
+def relative_volume_db(value: Union[str, int, float, dict]) -> Optional[float]:
+    """Return the dB offset of a relative volume value, or None if absolute.
+
+    Relative values are the ones parse_volume applies to current_linear:
+    "+3dB", "+3", "-3dB", "-inf dB" and {"relative_db": -3}.
+    """
+    if isinstance(value, dict):
+        if "db" in value or "linear" in value or "relative_db" not in value:
+            return None
+        return float(value["relative_db"])
+
+    if isinstance(value, str):
+        # Only a leading sign can make it relative; skip the parse otherwise
+        if value.lstrip()[:1] not in ("+", "-"):
+            return None
+        try:
+            relative, num = _parse_volume_str(value)
+        except (ValueError, OverflowError):
+            return None
+        if relative:
+            return num
+    return None
 
 
 def parse_pan(value: Union[str, int, float]) -> float:
@@ -71,31 +142,164 @@ def parse_pan(value: Union[str, int, float]) -> float:
         - float: -1.0 to 1.0 directly
         - str: "L50" (50% left = -0.5), "R30" (30% right = 0.3), "C" (center = 0)
     """
+    # Same as max(-1.0, min(1.0, pan)), NaN included, minus two calls
+    if type(value) is float:
+        # The common case: an exact float needs no conversion
+        return value if -1.0 <= value <= 1.0 else (-1.0 if value < -1.0 else 1.0)
     if isinstance(value, (int, float)):
-        return max(-1.0, min(1.0, float(value)))
+        pan = float(value)
+        return pan if -1.0 <= pan <= 1.0 else (-1.0 if pan < -1.0 else 1.0)
 
     if isinstance(value, str):
+        # Labels as format_pan writes them skip the strip, upper and regex
+        pan = _pan_values_get(value)
+        if pan is not None:
+            return pan
         value = value.strip().upper()
-        if value == "C" or value == "CENTER":
+        m = _PAN_RE.match(value)
+        if m is not None:
+            side, num_str = m.groups()
+            if side == "L" and num_str:
+                return -float(num_str) / 100.0
+            if side == "R" and num_str:
+                return float(num_str) / 100.0
+            if side == "C" and not num_str:
+                return 0.0
+        if value == "CENTER":
             return 0.0
+        # Tails the pattern doesn't cover ("R+30", "L1e1"); float() raises on junk
         if value.startswith("L"):
-            num = float(value[1:]) / 100.0
-            return -num
+            return -float(value[1:]) / 100.0
         if value.startswith("R"):
-            num = float(value[1:]) / 100.0
-            return num
+            return float(value[1:]) / 100.0
         # Try as number
         return max(-1.0, min(1.0, float(value)))
 
     raise ValueError(f"Cannot parse pan value: {value}")
 
 
-def resolve_track_ref(ref: Union[str, int], tracks: list) -> int:
+# Pan labels by whole percent, L100..C..R100; index with int(pan * 100) + 100
+_PAN_STRINGS = tuple(
+    [f"L{100 - i}" for i in range(100)] + ["C"] + [f"R{i + 1}" for i in range(100)]
+)
+
+
+def format_pan(pan: float) -> str:
+    """Format a -1.0..1.0 pan as "L50", "C" or "R30" (percent truncated)."""
+    return _PAN_STRINGS[max(0, min(200, int(pan * 100) + 100))]
+
+
+# The reverse for parse_pan, computed as its regex branch does ("L0" is -0.0)
+_PAN_VALUES = {
+    label: 0.0 if label == "C" else (
+        -float(label[1:]) / 100.0 if label[0] == "L" else float(label[1:]) / 100.0)
+    for label in _PAN_STRINGS
+}
+_pan_values_get = _PAN_VALUES.get
+
+
+# Below this many tracks one str.find pass over the haystack is as fast as
+# intersecting trigram postings (and they cost milliseconds to build)
+_TRIGRAM_MIN_TRACKS = 256
+
+
+class TrackIndex:
+    """A track list as parallel columns, lowercased once.
+
+    resolve_track_ref builds one for a plain list (and keeps the last). Build
+    one yourself to resolve many refs against the same tracks: for large
+    lists it also keeps trigram postings, so a partial-name lookup only
+    scans the names sharing every trigram of the ref.
+    """
+
+    __slots__ = ("exact", "names_lower", "haystack", "starts", "indices",
+                 "names", "_trigrams")
+
+    def __init__(self, tracks: list, trigrams: bool = True):
+        self.names = [t["name"] for t in tracks]
+        self.indices = [t["index"] for t in tracks]
+        self.names_lower = lowered = [name.lower() for name in self.names]
+        # lowercase name -> index of the first track with it
+        self.exact = {}
+        for name_lower, idx in zip(lowered, self.indices):
+            self.exact.setdefault(name_lower, idx)  # first track wins, as before
+        # names_lower joined by "\0", and the offset of each name in it
+        self.haystack = "\0".join(lowered)
+        self.starts = []
+        offset = 0
+        for name_lower in lowered:
+            self.starts.append(offset)
+            offset += len(name_lower) + 1
+        # trigram -> positions of the names containing it
+        self._trigrams = None
+        if trigrams and len(lowered) >= _TRIGRAM_MIN_TRACKS:
+            self._trigrams = {}
+            for k, name_lower in enumerate(lowered):
+                for j in range(len(name_lower) - 2):
+                    self._trigrams.setdefault(name_lower[j:j + 3], set()).add(k)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def contains(self, ref_lower: str, limit: int) -> List[int]:
+        """Positions of the first `limit` tracks whose name contains ref_lower."""
+        if self._trigrams is not None and len(ref_lower) >= 3:
+            return self._trigram_contains(ref_lower, limit)
+        if "\0" in ref_lower:
+            # A haystack hit could straddle two names; test them one by one
+            return [k for k, name in enumerate(self.names_lower) if ref_lower in name][:limit]
+        found = []
+        haystack, starts = self.haystack, self.starts
+        pos = haystack.find(ref_lower) if starts else -1
+        while pos >= 0 and len(found) < limit:
+            k = bisect_right(starts, pos) - 1
+            found.append(k)
+            if k + 1 == len(starts):
+                break
+            pos = haystack.find(ref_lower, starts[k + 1])
+        return found
+
+    def _trigram_contains(self, ref_lower: str, limit: int) -> List[int]:
+        trigrams = self._trigrams
+        postings = []
+        for j in range(len(ref_lower) - 2):
+            positions = trigrams.get(ref_lower[j:j + 3])
+            if positions is None:
+                return []
+            postings.append(positions)
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        # Sharing every trigram doesn't make ref_lower a substring; confirm
+        names_lower = self.names_lower
+        return [k for k in sorted(candidates) if ref_lower in names_lower[k]][:limit]
+
+
+# One-slot cache for _name_index: tools resolve several refs against the same
+# state snapshot. Keyed on the names and indices themselves, so a list edited
+# in place (a rename) is re-indexed and the caller's list isn't kept alive.
+_last_name_index: Optional[TrackIndex] = None
+
+
+def _name_index(tracks: list) -> TrackIndex:
+    global _last_name_index
+    cached = _last_name_index
+    if (cached is not None and len(cached.names) == len(tracks)
+            and all(name == t["name"] and idx == t["index"]
+                    for name, idx, t in zip(cached.names, cached.indices, tracks))):
+        return cached
+    # Usually a fresh snapshot per call: not worth the trigram postings
+    index = TrackIndex(tracks, trigrams=False)
+    _last_name_index = index
+    return index
+
+
+def resolve_track_ref(ref: Union[str, int], tracks: Union[list, TrackIndex]) -> int:
     """Resolve a track reference to an index.
 
     Args:
         ref: track name (fuzzy) or 1-based index
-        tracks: list of track dicts with 'name' and 'index' keys
+        tracks: list of track dicts with 'name' and 'index' keys, or a
+            TrackIndex built from one
 
     Returns: 0-based track index
     Raises: ValueError if not found or ambiguous
@@ -109,21 +313,21 @@ def resolve_track_ref(ref: Union[str, int], tracks: list) -> int:
 
     if isinstance(ref, str):
         ref_lower = ref.strip().lower()
+        index = tracks if isinstance(tracks, TrackIndex) else _name_index(tracks)
 
         # Exact match first
-        for t in tracks:
-            if t["name"].lower() == ref_lower:
-                return t["index"]
-
-        # Contains match
-        matches = [t for t in tracks if ref_lower in t["name"].lower()]
-        if len(matches) == 1:
-            return matches[0]["index"]
+        if ref_lower in index.exact:
+            return index.exact[ref_lower]
+
+        # Contains match, stopping at a second candidate
+        matches = index.contains(ref_lower, 2)
         if len(matches) > 1:
-            names = [m["name"] for m in matches]
+            names = [index.names[k] for k in index.contains(ref_lower, len(index))]
             raise ValueError(
                 f"Ambiguous track reference '{ref}'. Matches: {names}"
             )
+        if matches:
+            return index.indices[matches[0]]
 
         # Try as number
         try:
@@ -133,7 +337,44 @@ def resolve_track_ref(ref: Union[str, int], tracks: list) -> int:
 
         raise ValueError(
             f"No track found matching '{ref}'. "
-            f"Available: {[t['name'] for t in tracks]}"
+            f"Available: {index.names}"
         )
 
     raise ValueError(f"Invalid track reference type: {type(ref)}")
+
+
+# Characters a double-quoted Lua string can't hold verbatim
+_LUA_UNSAFE_RE = re.compile(r'[\\"\x00-\x1f\x7f]')
+
+
+def _lua_escape(match: re.Match) -> str:
+    return "\\%03d" % ord(match.group())
+
+
+def lua_literal(value) -> str:
+    """Render None/bool/number/str/list/dict as a Lua expression.
+
+    Strings use decimal escapes for quotes, backslashes and control
+    characters, so any text round-trips through Lua's lexer unchanged.
+    """
+    if value is None:
+        return "nil"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "(0/0)"
+        if math.isinf(value):
+            return "math.huge" if value > 0 else "-math.huge"
+        return repr(value)
+    if isinstance(value, str):
+        return '"' + _LUA_UNSAFE_RE.sub(_lua_escape, value) + '"'
+    if isinstance(value, (list, tuple)):
+        return "{" + ", ".join(lua_literal(v) for v in value) + "}"
+    if isinstance(value, dict):
+        return "{" + ", ".join(
+            f"[{lua_literal(k)}] = {lua_literal(v)}" for k, v in value.items()
+        ) + "}"
+    raise TypeError(f"Cannot convert {type(value).__name__} to a Lua literal")
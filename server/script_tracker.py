@@ -1,23 +1,78 @@
 """Script tracking and analytics with SQLite."""
 
+import atexit
+import functools
 import hashlib
+import json
+import logging
 import sqlite3
+import threading
 import time
 import os
+import queue
+import zlib
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Optional, List
+from typing import Dict, Iterator, Optional, List, Tuple
 
+try:
+    import blake3
+except ImportError:  # optional: pip install reaper-ai-tools[fast]
+    blake3 = None
 
-@dataclass
+logger = logging.getLogger(__name__)
+
+# Content-dedup key for scripts, not a security boundary
+HASH_ALGO = "blake3" if blake3 is not None else "sha256"
+
+
+@functools.lru_cache(maxsize=512)
+def _hash_code(code: str, algo: str) -> str:
+    # Users repeat the same scripts; keyed on algo so a switch never serves
+    # a stale digest
+    data = code.encode("utf-8")
+    if algo == "blake3":
+        return blake3.blake3(data).hexdigest(length=32)
+    return hashlib.sha256(data, usedforsecurity=False).hexdigest()
+
+
+def _code_preview(code: str) -> str:
+    """One-line display form of a script, as shown by get_common_scripts."""
+    preview = code[:100].replace("\n", " ")
+    return preview + "..." if len(code) > 100 else preview
+
+
+def _pack_code(code: str) -> bytes:
+    return zlib.compress(code.encode("utf-8"))
+
+
+def _unpack_code(blob: bytes) -> str:
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def hash_backend() -> str:
+    """Describe what hash_code runs on, for the startup log."""
+    if blake3 is not None:
+        return f"blake3 {getattr(blake3, '__version__', '')}".rstrip()
+    # CPython binds sha256 to OpenSSL's implementation (SHA-NI/ARMv8 SHA
+    # extensions where the CPU has them) unless built without it
+    if hashlib.sha256.__module__ == "_hashlib":
+        import ssl
+        return f"sha256 ({ssl.OPENSSL_VERSION})"
+    return "sha256 (builtin)"
+
+
+@dataclass(slots=True, frozen=True)
 class ScriptRecord:
     hash: str
-    code: str
+    code: Optional[str]  # None in get_common_scripts listings; see code_preview
     run_count: int
     error_count: int
     total_elapsed_ms: float
     first_seen: float
     last_seen: float
     last_error: Optional[str]
+    code_preview: str = ""
 
     @property
     def avg_elapsed_ms(self) -> float:
@@ -28,7 +83,7 @@ class ScriptRecord:
         return self.error_count / self.run_count if self.run_count > 0 else 0
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ScriptRun:
     id: int
     hash: str
@@ -41,154 +96,493 @@ class ScriptRun:
 DB_DIR = os.path.join(os.path.expanduser("~"), ".reaper-mcp")
 DB_PATH = os.path.join(DB_DIR, "scripts.db")
 
+# scripts.code keeps this many characters for display; the full text lives
+# zlib-compressed in script_code
+CODE_PREFIX_CHARS = 200
+
+# Read connections kept open for concurrent get_* calls
+READ_POOL_SIZE = 4
+
+# Executions are buffered and written in one transaction once either limit is hit
+FLUSH_MAX_RECORDS = 32
+FLUSH_MAX_AGE_S = 1.0
+
+# Planner statistics are refreshed after this many logged runs, and on close
+ANALYZE_EVERY_RUNS = 1000
+
 
 class ScriptTracker:
     """Track script executions in SQLite for analytics."""
 
+    # Hot statements, kept as constants so each connection's statement cache
+    # (sized by _STATEMENT_CACHE) prepares them once
+    _STATEMENT_CACHE = 32
+
+    _UPSERT_SCRIPT_SQL = """
+        INSERT INTO scripts (hash, code, run_count, error_count, total_elapsed_ms,
+                            first_seen, last_seen, last_error, code_preview)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(hash) DO UPDATE SET
+            run_count = run_count + excluded.run_count,
+            error_count = error_count + excluded.error_count,
+            total_elapsed_ms = total_elapsed_ms + excluded.total_elapsed_ms,
+            last_seen = excluded.last_seen,
+            last_error = COALESCE(excluded.last_error, scripts.last_error)
+    """
+
+    _INSERT_RUN_SQL = """
+        INSERT INTO script_runs (hash, timestamp, elapsed_ms, success, error)
+        VALUES (?, ?, ?, ?, ?)
+    """
+
+    _INSERT_CODE_SQL = """
+        INSERT OR IGNORE INTO script_code (hash, code) VALUES (?, ?)
+    """
+
+    _HISTORY_SQL = """
+        SELECT id, hash, timestamp, elapsed_ms, success, error
+        FROM script_runs
+        ORDER BY timestamp DESC
+        LIMIT ?
+    """
+
+    _TOP_SCRIPTS_SQL = """
+        SELECT hash, run_count, error_count, total_elapsed_ms, first_seen, last_seen,
+               code_preview
+        FROM scripts
+        WHERE run_count >= ?
+        ORDER BY run_count DESC
+        LIMIT ?
+    """
+
+    _GET_SCRIPT_SQL = """
+        SELECT s.hash, c.code, s.run_count, s.error_count, s.total_elapsed_ms,
+               s.first_seen, s.last_seen, s.last_error, s.code_preview
+        FROM scripts s JOIN script_code c ON c.hash = s.hash
+        WHERE s.hash = ?
+    """
+
+    # Hash lists travel as one JSON array, so the SQL text (and its cached
+    # statement) is the same for every list length
+    _KNOWN_CODE_SQL = """
+        SELECT hash FROM script_code WHERE hash IN (SELECT value FROM json_each(?))
+    """
+
+    _LAST_ERRORS_SQL = """
+        SELECT hash, last_error FROM scripts WHERE hash IN (SELECT value FROM json_each(?))
+    """
+
+    _STATS_SQL = """
+        SELECT (SELECT COUNT(*) FROM scripts),
+               (SELECT COUNT(*) FROM script_runs),
+               (SELECT COUNT(*) FROM script_runs WHERE success = 0),
+               (SELECT COUNT(*) FROM scripts WHERE run_count >= 2)
+    """
+
     def __init__(self, db_path: Optional[str] = None):
         self.db_path = db_path or DB_PATH
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # ":memory:" gives a private database that lives as long as the write
+        # connection; reads then go through that connection too
+        self._in_memory = self.db_path == ":memory:"
+        if not self._in_memory:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # One writer connection (SQLite has a single writer anyway), plus a
+        # bounded pool of readers; in WAL mode readers never block the writer
+        self._write_lock = threading.Lock()
+        self._write_conn: Optional[sqlite3.Connection] = None
+        self._read_pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._read_slots = threading.BoundedSemaphore(READ_POOL_SIZE)
         self._init_db()
+        # Buffered writes: run rows in order, and per-hash script aggregates
+        # [code, runs, errors, elapsed_ms, first_seen, last_seen, last_error]
+        self._pending_lock = threading.Lock()
+        self._pending_runs: List[tuple] = []
+        self._pending_script_updates: Dict[str, list] = {}
+        self._pending_since: Optional[float] = None
+        # Flushes a buffer that reaches FLUSH_MAX_AGE_S with no further
+        # record_execution to notice; armed by the first buffered run
+        self._flush_timer: Optional[threading.Timer] = None
+        self._batch_depth = 0  # open transaction() blocks
+        self._runs_since_analyze = 0  # guarded by _write_lock
+        # (code, hash) of the last record_execution, one tuple so threads
+        # swap it whole and never pair one call's code with another's hash
+        self._last: Tuple[Optional[str], str] = (None, "")
+        atexit.register(self.flush)
 
     def _init_db(self):
-        with self._connect() as conn:
-            conn.executescript("""
-                CREATE TABLE IF NOT EXISTS scripts (
-                    hash TEXT PRIMARY KEY,
-                    code TEXT NOT NULL,
-                    run_count INTEGER DEFAULT 0,
-                    error_count INTEGER DEFAULT 0,
-                    total_elapsed_ms REAL DEFAULT 0,
-                    first_seen REAL NOT NULL,
-                    last_seen REAL NOT NULL,
-                    last_error TEXT
-                );
-
-                CREATE TABLE IF NOT EXISTS script_runs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    hash TEXT NOT NULL,
-                    timestamp REAL NOT NULL,
-                    elapsed_ms REAL DEFAULT 0,
-                    success INTEGER NOT NULL,
-                    error TEXT,
-                    FOREIGN KEY (hash) REFERENCES scripts(hash)
-                );
-
-                CREATE INDEX IF NOT EXISTS idx_runs_hash ON script_runs(hash);
-                CREATE INDEX IF NOT EXISTS idx_runs_timestamp ON script_runs(timestamp);
-                CREATE INDEX IF NOT EXISTS idx_scripts_run_count ON scripts(run_count DESC);
-            """)
-
-    def _connect(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
+        conn = self._writer()
+        # Persistent: set once on the database file, not per connection
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS scripts (
+                hash TEXT PRIMARY KEY,
+                code TEXT NOT NULL,
+                run_count INTEGER DEFAULT 0,
+                error_count INTEGER DEFAULT 0,
+                total_elapsed_ms REAL DEFAULT 0,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                last_error TEXT,
+                code_preview TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS script_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                hash TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                elapsed_ms REAL DEFAULT 0,
+                success INTEGER NOT NULL,
+                error TEXT,
+                FOREIGN KEY (hash) REFERENCES scripts(hash)
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_runs_hash ON script_runs(hash);
+            CREATE INDEX IF NOT EXISTS idx_runs_timestamp ON script_runs(timestamp);
+            -- Failures only: get_stats counts them without scanning every run
+            CREATE INDEX IF NOT EXISTS idx_runs_failed ON script_runs(success)
+                WHERE success = 0;
+
+            CREATE TABLE IF NOT EXISTS script_code (
+                hash TEXT PRIMARY KEY,
+                code BLOB NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        self._migrate_preview(conn)
+        conn.executescript("""
+            -- Covers the top-scripts listing without touching the code column
+            DROP INDEX IF EXISTS idx_scripts_run_count;
+            DROP INDEX IF EXISTS idx_scripts_covering;
+            CREATE INDEX IF NOT EXISTS idx_scripts_top ON scripts(
+                run_count DESC, hash, error_count, total_elapsed_ms, first_seen, last_seen,
+                code_preview);
+        """)
+        self._migrate_code(conn)
+        self._migrate_hashes(conn)
+
+    def _migrate_preview(self, conn: sqlite3.Connection) -> None:
+        """Add and backfill code_preview on databases created without it.
+        scripts.code holds at least the first 200 characters, enough for
+        the 100-character preview."""
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(scripts)")}
+        if "code_preview" not in columns:
+            conn.execute("ALTER TABLE scripts ADD COLUMN code_preview TEXT")
+        conn.execute("""
+            UPDATE scripts
+            SET code_preview = substr(replace(code, char(10), ' '), 1, 100)
+                || CASE WHEN length(code) > 100 THEN '...' ELSE '' END
+            WHERE code_preview IS NULL
+        """)
+
+    def _migrate_code(self, conn: sqlite3.Connection) -> None:
+        """Move full script text written before script_code existed out of
+        the scripts rows, leaving the display prefix behind."""
+        legacy = conn.execute("""
+            SELECT s.hash, s.code FROM scripts s
+            LEFT JOIN script_code c ON c.hash = s.hash
+            WHERE c.hash IS NULL
+        """).fetchall()
+        if not legacy:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(self._INSERT_CODE_SQL,
+                             [(h, _pack_code(code)) for h, code in legacy])
+            conn.executemany("UPDATE scripts SET code = ? WHERE hash = ?",
+                             [(code[:CODE_PREFIX_CHARS], h) for h, code in legacy])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _migrate_hashes(self, conn: sqlite3.Connection) -> None:
+        """Re-key stored scripts if they were hashed with another algorithm.
+
+        Databases from before the meta table have no hash_algo row and were
+        always SHA-256. The code text is stored, so hashes can be recomputed.
+        Runs after _migrate_code, so every script has a script_code row.
+        """
+        row = conn.execute("SELECT value FROM meta WHERE key = 'hash_algo'").fetchone()
+        stored = row[0] if row else "sha256"
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if stored != HASH_ALGO:
+                conn.execute("CREATE TEMP TABLE rehash (old TEXT PRIMARY KEY, new TEXT NOT NULL)")
+                conn.executemany(
+                    "INSERT INTO temp.rehash VALUES (?, ?)",
+                    ((h, self.hash_code(_unpack_code(blob)))
+                     for h, blob in conn.execute("SELECT hash, code FROM script_code").fetchall()))
+                for table in ("scripts", "script_runs", "script_code"):
+                    conn.execute(f"""
+                        UPDATE {table}
+                        SET hash = (SELECT new FROM temp.rehash WHERE old = {table}.hash)
+                        WHERE hash IN (SELECT old FROM temp.rehash)
+                    """)
+                conn.execute("DROP TABLE temp.rehash")
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('hash_algo', ?)",
+                (HASH_ALGO,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _open(self) -> sqlite3.Connection:
+        # Autocommit mode: reads don't open implicit transactions, and writes
+        # are wrapped in explicit BEGIN/COMMIT
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               isolation_level=None,
+                               cached_statements=self._STATEMENT_CACHE)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA mmap_size=268435456")
+        # Caps the rows ANALYZE samples per index, so it stays cheap on big logs
+        conn.execute("PRAGMA analysis_limit=400")
+        return conn
+
+    def _writer(self) -> sqlite3.Connection:
+        """The write connection. Callers hold _write_lock (or are _init_db)."""
+        if self._write_conn is None:
+            self._write_conn = self._open()
+        return self._write_conn
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a pooled read connection; at most READ_POOL_SIZE are open.
+        Connections are kept, so page and statement caches stay warm."""
+        if self._in_memory:
+            # Another connection would open a different, empty database
+            with self._write_lock:
+                yield self._writer()
+            return
+        with self._read_slots:
+            try:
+                conn = self._read_pool.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+            try:
+                yield conn
+            finally:
+                self._read_pool.put(conn)
+
+    def close(self) -> None:
+        """Flush pending writes, refresh planner statistics (PRAGMA optimize)
+        and close all connections.
+
+        An in-memory database is discarded.
+        """
+        atexit.unregister(self.flush)
+        self.flush()
+        with self._write_lock:
+            if self._write_conn is not None:
+                if not self._in_memory:
+                    self._write_conn.execute("PRAGMA optimize")
+                self._write_conn.close()
+                self._write_conn = None
+        while True:
+            try:
+                self._read_pool.get_nowait().close()
+            except queue.Empty:
+                break
 
     @staticmethod
     def hash_code(code: str) -> str:
-        """SHA256 hash of the exact code string."""
-        return hashlib.sha256(code.encode("utf-8")).hexdigest()
+        """Hash of the exact code string: 64 hex chars of BLAKE3 when
+        installed, else SHA-256."""
+        return _hash_code(code, HASH_ALGO)
 
     def record_execution(self, code: str, elapsed_ms: float, success: bool,
                          error: Optional[str] = None) -> str:
-        """Record a script execution. Returns the code hash."""
-        code_hash = self.hash_code(code)
+        """Record a script execution. Returns the code hash.
+
+        The write is buffered; it reaches the database on the next flush(),
+        which happens every FLUSH_MAX_RECORDS runs, FLUSH_MAX_AGE_S after the
+        oldest buffered run (from a timer thread), or before any read.
+        """
+        # Back-to-back repeats of the same string object skip hashing entirely.
+        # Holding the object (not its id()) means a recycled id can't match.
+        last_code, code_hash = self._last
+        if code is not last_code:
+            code_hash = self.hash_code(code)
+            self._last = (code, code_hash)
         now = time.time()
-
-        with self._connect() as conn:
-            # Upsert into scripts
-            existing = conn.execute(
-                "SELECT hash FROM scripts WHERE hash = ?", (code_hash,)
-            ).fetchone()
-
-            if existing:
-                conn.execute("""
-                    UPDATE scripts SET
-                        run_count = run_count + 1,
-                        error_count = error_count + ?,
-                        total_elapsed_ms = total_elapsed_ms + ?,
-                        last_seen = ?,
-                        last_error = CASE WHEN ? IS NOT NULL THEN ? ELSE last_error END
-                    WHERE hash = ?
-                """, (0 if success else 1, elapsed_ms, now,
-                      error, error, code_hash))
+        errors = 0 if success else 1
+
+        with self._pending_lock:
+            self._pending_runs.append(
+                (code_hash, now, elapsed_ms, 1 if success else 0, error))
+            agg = self._pending_script_updates.get(code_hash)
+            if agg is None:
+                self._pending_script_updates[code_hash] = [
+                    code, 1, errors, elapsed_ms, now, now, error]
             else:
-                conn.execute("""
-                    INSERT INTO scripts (hash, code, run_count, error_count,
-                                        total_elapsed_ms, first_seen, last_seen, last_error)
-                    VALUES (?, ?, 1, ?, ?, ?, ?, ?)
-                """, (code_hash, code, 0 if success else 1,
-                      elapsed_ms, now, now, error))
-
-            # Log the individual run
-            conn.execute("""
-                INSERT INTO script_runs (hash, timestamp, elapsed_ms, success, error)
-                VALUES (?, ?, ?, ?, ?)
-            """, (code_hash, now, elapsed_ms, 1 if success else 0, error))
-
+                agg[1] += 1
+                agg[2] += errors
+                agg[3] += elapsed_ms
+                agg[5] = now
+                if error is not None:
+                    agg[6] = error
+            if self._pending_since is None:
+                self._pending_since = now
+            due = self._batch_depth == 0 and (
+                len(self._pending_runs) >= FLUSH_MAX_RECORDS
+                or now - self._pending_since >= FLUSH_MAX_AGE_S)
+            if not due and self._flush_timer is None:
+                self._flush_timer = threading.Timer(FLUSH_MAX_AGE_S, self._flush_overdue)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+        if due:
+            self.flush()
         return code_hash
 
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Write everything recorded inside the block in one transaction.
+
+        The record-count and age limits don't flush while a block is open;
+        the outermost block flushes on exit. Reads still flush first.
+        """
+        with self._pending_lock:
+            self._batch_depth += 1
+        try:
+            yield
+        finally:
+            with self._pending_lock:
+                self._batch_depth -= 1
+                outermost = self._batch_depth == 0
+            if outermost:
+                self.flush()
+
+    def _flush_overdue(self) -> None:
+        """Timer callback: flush unless a transaction() block will."""
+        with self._pending_lock:
+            self._flush_timer = None
+            if self._batch_depth:
+                return
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            # Runs stay buffered for the next flush
+            logger.warning(f"Script tracker flush failed: {e}")
+
+    def flush(self) -> None:
+        """Write buffered executions in a single transaction.
+
+        If the write fails the runs go back into the buffer before the error
+        propagates, so a later flush can still store them.
+        """
+        with self._pending_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending_runs:
+                return
+            runs, self._pending_runs = self._pending_runs, []
+            updates, self._pending_script_updates = self._pending_script_updates, {}
+            since, self._pending_since = self._pending_since, None
+
+        with self._write_lock:
+            conn = self._writer()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(self._UPSERT_SCRIPT_SQL,
+                                 [(code_hash, agg[0][:CODE_PREFIX_CHARS], *agg[1:],
+                                   _code_preview(agg[0]))
+                                  for code_hash, agg in updates.items()])
+
+                # Full text only for hashes not stored yet; repeats skip the compress
+                known = {h for (h,) in conn.execute(
+                    self._KNOWN_CODE_SQL, (json.dumps(list(updates)),))}
+                conn.executemany(self._INSERT_CODE_SQL,
+                                 [(h, _pack_code(agg[0]))
+                                  for h, agg in updates.items() if h not in known])
+
+                # Log the individual runs
+                conn.executemany(self._INSERT_RUN_SQL, runs)
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                self._restore_pending(runs, updates, since)
+                raise
+
+            # Keep row-count estimates in step with a growing log
+            self._runs_since_analyze += len(runs)
+            if self._runs_since_analyze >= ANALYZE_EVERY_RUNS:
+                conn.execute("ANALYZE")
+                self._runs_since_analyze = 0
+
+    def _restore_pending(self, runs: List[tuple], updates: Dict[str, list],
+                         since: Optional[float]) -> None:
+        """Put a failed flush's runs back ahead of anything recorded since."""
+        with self._pending_lock:
+            self._pending_runs[:0] = runs
+            for code_hash, agg in updates.items():
+                newer = self._pending_script_updates.get(code_hash)
+                if newer is not None:
+                    agg[1] += newer[1]
+                    agg[2] += newer[2]
+                    agg[3] += newer[3]
+                    agg[5] = newer[5]
+                    if newer[6] is not None:
+                        agg[6] = newer[6]
+                self._pending_script_updates[code_hash] = agg
+            if since is not None and (self._pending_since is None or since < self._pending_since):
+                self._pending_since = since
+
     def get_history(self, limit: int = 20) -> List[ScriptRun]:
         """Get recent script runs."""
-        with self._connect() as conn:
-            rows = conn.execute("""
-                SELECT id, hash, timestamp, elapsed_ms, success, error
-                FROM script_runs
-                ORDER BY timestamp DESC
-                LIMIT ?
-            """, (limit,)).fetchall()
-
-        return [ScriptRun(
-            id=r[0], hash=r[1], timestamp=r[2],
-            elapsed_ms=r[3], success=bool(r[4]), error=r[5]
-        ) for r in rows]
+        self.flush()
+        with self._reader() as conn:
+            rows = conn.execute(self._HISTORY_SQL, (limit,)).fetchall()
+
+        return [ScriptRun(id_, code_hash, ts, elapsed_ms, bool(success), error)
+                for id_, code_hash, ts, elapsed_ms, success, error in rows]
 
     def get_common_scripts(self, min_runs: int = 2, limit: int = 20) -> List[ScriptRecord]:
-        """Get scripts that have been run multiple times."""
-        with self._connect() as conn:
-            rows = conn.execute("""
-                SELECT hash, code, run_count, error_count, total_elapsed_ms,
-                       first_seen, last_seen, last_error
-                FROM scripts
-                WHERE run_count >= ?
-                ORDER BY run_count DESC
-                LIMIT ?
-            """, (min_runs, limit)).fetchall()
-
-        return [ScriptRecord(
-            hash=r[0], code=r[1], run_count=r[2], error_count=r[3],
-            total_elapsed_ms=r[4], first_seen=r[5], last_seen=r[6],
-            last_error=r[7]
-        ) for r in rows]
+        """Get scripts that have been run multiple times.
+
+        Records carry code_preview only (code is None); use get_script for
+        the full text.
+        """
+        self.flush()
+        with self._reader() as conn:
+            # Index-only scan for the ranking, then one IN-list lookup for the
+            # error text the index leaves out
+            top = conn.execute(self._TOP_SCRIPTS_SQL, (min_runs, limit)).fetchall()
+            if not top:
+                return []
+
+            last_errors = dict(conn.execute(
+                self._LAST_ERRORS_SQL, (json.dumps([r[0] for r in top]),)).fetchall())
+
+        return [ScriptRecord(h, None, run_count, error_count, elapsed_ms,
+                             first_seen, last_seen, last_errors[h], preview)
+                for h, run_count, error_count, elapsed_ms, first_seen, last_seen, preview in top]
 
     def get_script(self, code_hash: str) -> Optional[ScriptRecord]:
         """Get a script by its hash."""
-        with self._connect() as conn:
-            row = conn.execute("""
-                SELECT hash, code, run_count, error_count, total_elapsed_ms,
-                       first_seen, last_seen, last_error
-                FROM scripts
-                WHERE hash = ?
-            """, (code_hash,)).fetchone()
+        self.flush()
+        with self._reader() as conn:
+            row = conn.execute(self._GET_SCRIPT_SQL, (code_hash,)).fetchone()
 
         if not row:
             return None
 
-        return ScriptRecord(
-            hash=row[0], code=row[1], run_count=row[2], error_count=row[3],
-            total_elapsed_ms=row[4], first_seen=row[5], last_seen=row[6],
-            last_error=row[7]
-        )
+        return ScriptRecord(row[0], _unpack_code(row[1]), *row[2:])
 
     def get_stats(self) -> dict:
         """Get overall statistics."""
-        with self._connect() as conn:
-            total_scripts = conn.execute("SELECT COUNT(*) FROM scripts").fetchone()[0]
-            total_runs = conn.execute("SELECT COUNT(*) FROM script_runs").fetchone()[0]
-            total_errors = conn.execute(
-                "SELECT COUNT(*) FROM script_runs WHERE success = 0"
-            ).fetchone()[0]
-            unique_repeated = conn.execute(
-                "SELECT COUNT(*) FROM scripts WHERE run_count >= 2"
-            ).fetchone()[0]
+        self.flush()
+        with self._reader() as conn:
+            total_scripts, total_runs, total_errors, unique_repeated = \
+                conn.execute(self._STATS_SQL).fetchone()
 
         return {
             "total_unique_scripts": total_scripts,
@@ -200,11 +594,8 @@ class ScriptTracker:
 
 
 # Singleton
-_tracker: Optional[ScriptTracker] = None
-
-
+@functools.cache
 def get_tracker() -> ScriptTracker:
-    global _tracker
-    if _tracker is None:
-        _tracker = ScriptTracker()
-    return _tracker
+    tracker = ScriptTracker()
+    logger.info(f"Script tracker: {tracker.db_path}, hashes via {hash_backend()}")
+    return tracker
@@ -1,5 +1,6 @@
 """Script analytics tools: history, common scripts."""
 
+import asyncio
 import time
 from mcp.server.fastmcp import FastMCP
 from server.script_tracker import get_tracker
@@ -15,8 +16,9 @@ def register(mcp: FastMCP):
             limit: Number of recent runs to show (default 20)
         """
         tracker = get_tracker()
-        runs = tracker.get_history(limit)
-        stats = tracker.get_stats()
+        # SQLite reads block; keep them off the event loop
+        runs = await asyncio.to_thread(tracker.get_history, limit)
+        stats = await asyncio.to_thread(tracker.get_stats)
 
         if not runs:
             return "No scripts have been executed yet."
@@ -27,9 +29,10 @@ def register(mcp: FastMCP):
             f"{stats['error_rate']:.0%} error rate)\n"
         ]
 
+        now = time.time()
         for run in runs:
             status = "OK" if run.success else "ERR"
-            ago = _format_ago(time.time() - run.timestamp)
+            ago = _format_ago(now - run.timestamp)
             line = f"  [{status}] {run.elapsed_ms:.0f}ms | {ago} ago | {run.hash[:12]}"
             if run.error:
                 line += f" | {run.error[:60]}"
@@ -48,7 +51,8 @@ def register(mcp: FastMCP):
             limit: Maximum results (default 10)
         """
         tracker = get_tracker()
-        scripts = tracker.get_common_scripts(min_runs=min_runs, limit=limit)
+        scripts = await asyncio.to_thread(
+            tracker.get_common_scripts, min_runs=min_runs, limit=limit)
 
         if not scripts:
             return f"No scripts have been run {min_runs}+ times yet."
@@ -56,11 +60,8 @@ def register(mcp: FastMCP):
         lines = [f"Scripts run {min_runs}+ times ({len(scripts)} found):\n"]
 
         for s in scripts:
-            code_preview = s.code[:100].replace("\n", " ")
-            if len(s.code) > 100:
-                code_preview += "..."
             lines.append(f"  [{s.run_count}x] avg {s.avg_elapsed_ms:.0f}ms | {s.error_rate:.0%} errors")
-            lines.append(f"    {code_preview}")
+            lines.append(f"    {s.code_preview}")
             lines.append(f"    hash: {s.hash[:16]}")
             lines.append("")
 
@@ -5,6 +5,9 @@ from mcp.server.fastmcp import FastMCP
 from server.api_index import get_api_index
 from server.connection import get_connection, ConnectionError
 
+# Set once the docs index is known to be populated; it never empties again
+_docs_indexed = False
+
 
 def register(mcp: FastMCP):
 
@@ -21,17 +24,20 @@ def register(mcp: FastMCP):
             limit: Maximum results to return (default 15)
             available_only: Only show functions confirmed available on this REAPER install
         """
+        global _docs_indexed
         index = get_api_index()
 
         # Build index on first use if needed
-        if not index.is_indexed:
-            count = index.build_index()
-            if count == 0:
-                return (
-                    "API docs not indexed yet. Place reascripthelp.html in the data/ "
-                    "directory, or generate it from REAPER (Help > ReaScript documentation) "
-                    "and provide the path."
-                )
+        if not _docs_indexed:
+            if not index.is_indexed:
+                count = index.build_index()
+                if count == 0:
+                    return (
+                        "API docs not indexed yet. Place reascripthelp.html in the data/ "
+                        "directory, or generate it from REAPER (Help > ReaScript documentation) "
+                        "and provide the path."
+                    )
+            _docs_indexed = True
 
         results = index.search(query, limit=limit, available_only=available_only)
 
@@ -1,6 +1,7 @@
 """Composer's Assistant tools: install/deploy to REAPER and manage nn_server."""
 
 import asyncio
+import collections
 import logging
 import os
 import shutil
@@ -20,8 +21,26 @@ CA_SCRIPTS = CA_ROOT / "scripts"
 CA_EFFECTS = CA_ROOT / "effects"
 CA_MODELS = CA_ROOT / "models"
 
-# Subprocess handle for nn_server
-_nn_server_process: Optional[subprocess.Popen] = None
+# Subprocess handle for nn_server, plus its recent output. The pipe is
+# drained continuously so a chatty server never blocks on a full pipe.
+_nn_server_process: Optional[asyncio.subprocess.Process] = None
+_nn_server_output: collections.deque = collections.deque(maxlen=200)
+_nn_server_drain: Optional[asyncio.Task] = None
+
+
+def _nn_server_running() -> bool:
+    return _nn_server_process is not None and _nn_server_process.returncode is None
+
+
+async def _drain_output(stream: asyncio.StreamReader) -> None:
+    """Collect nn_server stdout/stderr line by line until EOF."""
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        text = line.decode(errors="replace").rstrip()
+        _nn_server_output.append(text)
+        logger.debug(f"nn_server: {text}")
 
 
 def _find_python() -> str:
@@ -33,6 +52,23 @@ def _find_python() -> str:
     return sys.executable
 
 
+def _copy_files(src: Path, dest: Path) -> int:
+    """Copy the top-level files of src into dest (created if missing).
+    Subdirectories such as __pycache__ are skipped. Returns the file count."""
+    copied = 0
+
+    def copy(s, d):
+        nonlocal copied
+        copied += 1
+        return shutil.copy2(s, d)
+
+    shutil.copytree(
+        src, dest, dirs_exist_ok=True, copy_function=copy,
+        ignore=lambda d, names: [n for n in names if os.path.isdir(os.path.join(d, n))],
+    )
+    return copied
+
+
 def register(mcp: FastMCP):
 
     @mcp.tool()
@@ -99,7 +135,7 @@ def register(mcp: FastMCP):
                 parts.append(f"  and extract into: {CA_MODELS}")
 
             # Check nn_server
-            if _nn_server_process and _nn_server_process.poll() is None:
+            if _nn_server_running():
                 parts.append(f"nn_server: Running (PID {_nn_server_process.pid})")
             else:
                 parts.append("nn_server: Not running")
@@ -109,22 +145,12 @@ def register(mcp: FastMCP):
         elif action == "install":
             parts = []
 
-            # Copy scripts
-            dest_scripts.mkdir(parents=True, exist_ok=True)
-            script_count = 0
-            for f in CA_SCRIPTS.iterdir():
-                if f.is_file():
-                    shutil.copy2(f, dest_scripts / f.name)
-                    script_count += 1
+            # Copy scripts and effects, both trees at once and off the event loop
+            script_count, effect_count = await asyncio.gather(
+                asyncio.to_thread(_copy_files, CA_SCRIPTS, dest_scripts),
+                asyncio.to_thread(_copy_files, CA_EFFECTS, dest_effects),
+            )
             parts.append(f"Copied {script_count} script files to {dest_scripts}")
-
-            # Copy effects
-            dest_effects.mkdir(parents=True, exist_ok=True)
-            effect_count = 0
-            for f in CA_EFFECTS.iterdir():
-                if f.is_file():
-                    shutil.copy2(f, dest_effects / f.name)
-                    effect_count += 1
             parts.append(f"Copied {effect_count} effect files to {dest_effects}")
 
             # Register action scripts in REAPER
@@ -197,7 +223,7 @@ def register(mcp: FastMCP):
                     "stop" to shut it down,
                     "status" to check if it's running
         """
-        global _nn_server_process
+        global _nn_server_process, _nn_server_drain
 
         if action not in ("start", "stop", "status"):
             return f"Unknown action: {action}. Use 'start', 'stop', or 'status'."
@@ -205,8 +231,11 @@ def register(mcp: FastMCP):
         nn_server_script = CA_SCRIPTS / "composers_assistant_nn_server.py"
 
         if action == "status":
-            if _nn_server_process and _nn_server_process.poll() is None:
-                return f"nn_server: Running (PID {_nn_server_process.pid})"
+            if _nn_server_running():
+                status = f"nn_server: Running (PID {_nn_server_process.pid})"
+                if _nn_server_output:
+                    status += "\nRecent output:\n" + "\n".join(list(_nn_server_output)[-10:])
+                return status
             else:
                 if _nn_server_process:
                     rc = _nn_server_process.returncode
@@ -216,7 +245,7 @@ def register(mcp: FastMCP):
 
         elif action == "start":
             # Check if already running
-            if _nn_server_process and _nn_server_process.poll() is None:
+            if _nn_server_running():
                 return f"nn_server: Already running (PID {_nn_server_process.pid})"
 
             # Verify script exists
@@ -233,19 +262,25 @@ def register(mcp: FastMCP):
 
             python = _find_python()
             try:
-                _nn_server_process = subprocess.Popen(
-                    [python, str(nn_server_script)],
+                _nn_server_output.clear()
+                _nn_server_process = await asyncio.create_subprocess_exec(
+                    python, str(nn_server_script),
                     cwd=str(CA_SCRIPTS),
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
                     creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == "nt" else 0,
                 )
-                # Give it a moment to start or fail
-                await asyncio.sleep(2)
+                _nn_server_drain = asyncio.create_task(_drain_output(_nn_server_process.stdout))
 
-                if _nn_server_process.poll() is not None:
-                    output = _nn_server_process.stdout.read().decode(errors="replace") if _nn_server_process.stdout else ""
-                    rc = _nn_server_process.returncode
+                # Give it a moment to start or fail; a quick failure returns early
+                try:
+                    rc = await asyncio.wait_for(_nn_server_process.wait(), timeout=2)
+                except asyncio.TimeoutError:
+                    rc = None
+
+                if rc is not None:
+                    await _nn_server_drain
+                    output = "\n".join(_nn_server_output)
                     _nn_server_process = None
                     return f"nn_server failed to start (exit code {rc}).\n{output}"
 
@@ -260,17 +295,17 @@ def register(mcp: FastMCP):
                 return f"Failed to start nn_server: {e}"
 
         elif action == "stop":
-            if not _nn_server_process or _nn_server_process.poll() is not None:
+            if not _nn_server_running():
                 _nn_server_process = None
                 return "nn_server: Not running"
 
             pid = _nn_server_process.pid
             _nn_server_process.terminate()
             try:
-                _nn_server_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
+                await asyncio.wait_for(_nn_server_process.wait(), timeout=5)
+            except asyncio.TimeoutError:
                 _nn_server_process.kill()
-                _nn_server_process.wait(timeout=5)
+                await asyncio.wait_for(_nn_server_process.wait(), timeout=5)
 
             _nn_server_process = None
             return f"nn_server stopped (was PID {pid})"
@@ -1,134 +1,97 @@
 """MIDI tools: insert_midi, read_midi."""
 
+import base64
+import math
+import struct
 from typing import Union, List
 from mcp.server.fastmcp import FastMCP
 from server.connection import get_connection, ConnectionError
 
 
-def register(mcp: FastMCP):
+# Lua scripts are fixed text; the track ref and note data arrive as ... so
+# the bridge compiles each one once (see ReaperConnection.execute_cached)
+_INSERT_MIDI_LUA = """
+            local args = ...
 
-    @mcp.tool()
-    async def insert_midi(track: Union[str, int], start_beat: float,
-                          length_beats: float, notes: list) -> str:
-        """Insert MIDI notes into a track.
-
-        Creates a new MIDI item and inserts notes. Beats are relative to project start.
-
-        Args:
-            track: Track name or 1-based index
-            start_beat: Start position in beats (beat 1 = project start)
-            length_beats: Length of the MIDI item in beats
-            notes: List of note dicts, each with:
-                - pitch: MIDI note number (0-127, 60=C4)
-                - start: Start offset in beats from item start
-                - length: Duration in beats
-                - velocity: 1-127 (default 100)
-                - channel: 0-15 (default 0)
-        """
-        conn = get_connection()
-
-        # Build Lua code to create item and insert notes
-        note_inserts = []
-        for i, note in enumerate(notes):
-            pitch = int(note.get("pitch", 60))
-            start = float(note.get("start", 0))
-            length = float(note.get("length", 0.5))
-            vel = int(note.get("velocity", 100))
-            ch = int(note.get("channel", 0))
-            note_inserts.append(
-                f"  reaper.MIDI_InsertNote(take, false, false, "
-                f"ppq({start}), ppq({start + length}), {ch}, {pitch}, {vel}, true)"
-            )
-
-        notes_code = "\n".join(note_inserts)
-
-        code = f"""
             -- Resolve track
-            local track_ref = {repr(str(track)) if isinstance(track, str) else f'reaper.GetTrack(0, {int(track) - 1})'}
+            local track_ref = args.track
             local tr
             if type(track_ref) == "string" then
-                local target = track_ref:lower()
-                for i = 0, reaper.CountTracks(0) - 1 do
-                    local t = reaper.GetTrack(0, i)
-                    local _, name = reaper.GetTrackName(t)
-                    if name:lower():find(target, 1, true) then
-                        tr = t
-                        break
-                    end
-                end
+                tr = _resolve_track_by_substring(track_ref:lower())
                 if not tr then
                     print("ERROR: No track found matching '" .. track_ref .. "'")
                     return
                 end
             else
-                tr = track_ref
+                tr = reaper.GetTrack(0, track_ref - 1)
             end
 
             -- Convert beats to time
             local tempo = reaper.Master_GetTempo()
             local beat_dur = 60.0 / tempo
-            local start_time = ({start_beat} - 1) * beat_dur
-            local end_time = start_time + {length_beats} * beat_dur
+            local start_time = (args.start_beat - 1) * beat_dur
+            local end_time = start_time + args.length_beats * beat_dur
 
             -- Create MIDI item
             local item = reaper.CreateNewMIDIItemInProj(tr, start_time, end_time)
             local take = reaper.GetActiveTake(item)
 
-            -- Helper: beat offset to PPQ (960 PPQ per beat)
+            -- Beat offsets to PPQ (960 PPQ per beat)
             local item_start_ppq = reaper.MIDI_GetPPQPosFromProjTime(take, start_time)
-            local function ppq(beat_offset)
-                return item_start_ppq + beat_offset * 960
-            end
 
             -- Insert notes
-{notes_code}
+            local count
+            if args.packed then
+                -- Base64 of fixed-size records: pitch, channel, start and end
+                -- tick (relative to the item), velocity
+                local digits = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+                local dec = {}
+                for i = 1, 64 do dec[digits:byte(i)] = i - 1 end
+                local packed, bytes = args.packed, {}
+                for i = 1, #packed, 4 do
+                    local a, b, c, d = packed:byte(i, i + 3)
+                    local n = (dec[a] << 18) | (dec[b] << 12) | ((dec[c] or 0) << 6) | (dec[d] or 0)
+                    bytes[#bytes + 1] = string.char(n >> 16, (n >> 8) & 0xFF, n & 0xFF)
+                end
+                local data = table.concat(bytes)
+                local size = string.packsize("<BBiiB")
+                count = #data // size
+                for off = 1, count * size, size do
+                    local pitch, chan, start_tick, end_tick, vel = string.unpack("<BBiiB", data, off)
+                    reaper.MIDI_InsertNote(take, false, false,
+                        item_start_ppq + start_tick, item_start_ppq + end_tick,
+                        chan, pitch, vel, true)
+                end
+            else
+                local pitches, starts, lengths = args.pitches, args.starts, args.lengths
+                local vels, chans = args.vels, args.chans
+                count = #pitches
+                for i = 1, count do
+                    reaper.MIDI_InsertNote(take, false, false,
+                        item_start_ppq + starts[i] * 960,
+                        item_start_ppq + (starts[i] + lengths[i]) * 960,
+                        chans[i], pitches[i], vels[i], true)
+                end
+            end
 
             reaper.MIDI_Sort(take)
 
             local _, track_name = reaper.GetTrackName(tr)
             print(string.format("Inserted %d notes into '%s' at beat %.1f (%.2fs)",
-                {len(notes)}, track_name, {start_beat}, start_time))
-        """
+                count, track_name, args.start_beat, start_time))
+"""
 
-        try:
-            result = await conn.execute(code, undo_label="Insert MIDI")
-            if result.get("success"):
-                return result.get("stdout", f"Inserted {len(notes)} notes")
-            return f"Error: {result.get('error', {}).get('message', 'unknown')}"
-        except ConnectionError as e:
-            return f"Error: {e}"
-
-    @mcp.tool()
-    async def read_midi(track: Union[str, int]) -> str:
-        """Read MIDI notes from a track as human-readable text.
-
-        Shows all notes with their pitch (note name), position, duration,
-        velocity, and channel.
-
-        Args:
-            track: Track name or 1-based index
-        """
-        conn = get_connection()
-
-        code = f"""
-            local track_ref = {repr(str(track)) if isinstance(track, str) else f'reaper.GetTrack(0, {int(track) - 1})'}
+_READ_MIDI_LUA = """
+            local track_ref = ...
             local tr
             if type(track_ref) == "string" then
-                local target = track_ref:lower()
-                for i = 0, reaper.CountTracks(0) - 1 do
-                    local t = reaper.GetTrack(0, i)
-                    local _, name = reaper.GetTrackName(t)
-                    if name:lower():find(target, 1, true) then
-                        tr = t
-                        break
-                    end
-                end
+                tr = _resolve_track_by_substring(track_ref:lower())
                 if not tr then
                     print("ERROR: No track found matching '" .. track_ref .. "'")
                     return
                 end
             else
-                tr = track_ref
+                tr = reaper.GetTrack(0, track_ref - 1)
                 if not tr then
                     print("ERROR: Invalid track")
                     return
@@ -136,14 +99,17 @@ def register(mcp: FastMCP):
             end
 
             local _, track_name = reaper.GetTrackName(tr)
-            local note_names = {{"C","C#","D","D#","E","F","F#","G","G#","A","A#","B"}}
+            local note_names = {"C","C#","D","D#","E","F","F#","G","G#","A","A#","B"}
 
             local function pitch_name(p)
                 return note_names[(p % 12) + 1] .. math.floor(p / 12 - 1)
             end
 
+            local parts = {}
             local total_notes = 0
             local num_items = reaper.CountTrackMediaItems(tr)
+            local tempo = reaper.Master_GetTempo()
+            local beats_per_sec = tempo / 60
 
             for item_idx = 0, num_items - 1 do
                 local item = reaper.GetTrackMediaItem(tr, item_idx)
@@ -152,23 +118,66 @@ def register(mcp: FastMCP):
                     local _, note_count = reaper.MIDI_CountEvts(take)
                     if note_count > 0 then
                         local item_pos = reaper.GetMediaItemInfo_Value(item, "D_POSITION")
-                        print(string.format("Item at %.2fs (%d notes):", item_pos, note_count))
-
-                        for n = 0, math.min(note_count, 200) - 1 do
-                            local _, _, _, startppq, endppq, ch, pitch, vel = reaper.MIDI_GetNote(take, n)
-                            local start_time = reaper.MIDI_GetProjTimeFromPPQPos(take, startppq)
-                            local end_time = reaper.MIDI_GetProjTimeFromPPQPos(take, endppq)
-                            local dur = end_time - start_time
-                            local tempo = reaper.Master_GetTempo()
-                            local start_beat = start_time * tempo / 60 + 1
-                            local dur_beats = dur * tempo / 60
-
-                            print(string.format("  %s (%-3d) | beat %6.2f | dur %.2f beats | vel %3d | ch %d",
-                                pitch_name(pitch), pitch, start_beat, dur_beats, vel, ch))
+                        parts[#parts + 1] = string.format("Item at %.2fs (%d notes):", item_pos, note_count)
+
+                        -- Decode the first 200 notes from the raw event buffer
+                        -- (one API call) instead of MIDI_GetNote plus two time
+                        -- conversions per note. One tempo per item, as the beat
+                        -- conversion below already assumes.
+                        local _, buf = reaper.MIDI_GetAllEvts(take, "")
+                        local t0 = reaper.MIDI_GetProjTimeFromPPQPos(take, 0)
+                        local sec_per_ppq = (reaper.MIDI_GetProjTimeFromPPQPos(take, 960) - t0) / 960
+                        local limit = math.min(note_count, 200)
+                        -- held: tracked notes still sounding, per channel/key;
+                        -- untracked: note-ons past the limit still sounding, per key
+                        local notes, held, held_count, untracked = {}, {}, 0, {}
+                        local pos, ppq, buf_len = 1, 0, #buf
+                        while pos <= buf_len and (#notes < limit or held_count > 0) do
+                            local offset, _, msg
+                            offset, _, msg, pos = string.unpack("<i4Bs4", buf, pos)
+                            ppq = ppq + offset
+                            if #msg == 3 then
+                                local status, pitch, vel = msg:byte(1, 3)
+                                local kind = status & 0xF0
+                                local key = (status & 0x0F) * 128 + pitch
+                                if kind == 0x90 and vel > 0 then
+                                    if #notes < limit then
+                                        local note = {ppq, nil, status & 0x0F, pitch, vel}
+                                        notes[#notes + 1] = note
+                                        local queue = held[key]
+                                        if queue then queue[#queue + 1] = note else held[key] = {note} end
+                                        held_count = held_count + 1
+                                    else
+                                        untracked[key] = (untracked[key] or 0) + 1
+                                    end
+                                elseif kind == 0x80 or kind == 0x90 then
+                                    -- Note-off: ends an untracked note on that key if one
+                                    -- is sounding, else the oldest held note
+                                    local queue = held[key]
+                                    local skipped = untracked[key]
+                                    if skipped and skipped > 0 then
+                                        untracked[key] = skipped - 1
+                                    elseif queue and #queue > 0 then
+                                        table.remove(queue, 1)[2] = ppq
+                                        held_count = held_count - 1
+                                    end
+                                end
+                            end
+                        end
+
+                        for _, note in ipairs(notes) do
+                            local startppq, endppq, ch, pitch, vel = note[1], note[2] or ppq, note[3], note[4], note[5]
+                            local start_time = t0 + startppq * sec_per_ppq
+                            local dur = (endppq - startppq) * sec_per_ppq
+                            local start_beat = start_time * beats_per_sec + 1
+                            local dur_beats = dur * beats_per_sec
+
+                            parts[#parts + 1] = string.format("  %s (%-3d) | beat %6.2f | dur %.2f beats | vel %3d | ch %d",
+                                pitch_name(pitch), pitch, start_beat, dur_beats, vel, ch)
                         end
 
                         if note_count > 200 then
-                            print(string.format("  ... and %d more notes", note_count - 200))
+                            parts[#parts + 1] = string.format("  ... and %d more notes", note_count - 200)
                         end
                         total_notes = total_notes + note_count
                     end
@@ -176,14 +185,114 @@ def register(mcp: FastMCP):
             end
 
             if total_notes == 0 then
-                print("No MIDI notes found on track '" .. track_name .. "'")
+                parts[#parts + 1] = "No MIDI notes found on track '" .. track_name .. "'"
             else
-                print(string.format("\\nTotal: %d notes on '%s'", total_notes, track_name))
+                parts[#parts + 1] = string.format("\\nTotal: %d notes on '%s'", total_notes, track_name)
             end
+            print(table.concat(parts, "\\n"))
+"""
+
+# insert_midi sends larger note lists as records of pitch, channel, start and
+# end tick (960 per beat, from the item start) and velocity
+_PACK_NOTES_OVER = 512
+_NOTE_RECORD = struct.Struct("<BBiiB")
+
+
+def register(mcp: FastMCP):
+
+    @mcp.tool()
+    async def insert_midi(track: Union[str, int], start_beat: float,
+                          length_beats: float, notes: list) -> str:
+        """Insert MIDI notes into a track.
+
+        Creates a new MIDI item and inserts notes. Beats are relative to project start.
+
+        Args:
+            track: Track name or 1-based index
+            start_beat: Start position in beats (beat 1 = project start)
+            length_beats: Length of the MIDI item in beats
+            notes: List of note dicts, each with:
+                - pitch: MIDI note number (0-127, 60=C4)
+                - start: Start offset in beats from item start
+                - length: Duration in beats
+                - velocity: 1-127 (default 100)
+                - channel: 0-15 (default 0)
+        """
+        conn = get_connection()
+
+        # Note columns as flat arrays (one per field) so the script body is
+        # a single loop regardless of note count; they travel as arguments,
+        # so the script text is the same on every call
+        pitches, starts, lengths, vels, chans = [], [], [], [], []
+        for i, note in enumerate(notes, 1):
+            if not isinstance(note, dict):
+                return f"Invalid note {i}: expected a dict, got {note!r}"
+            try:
+                pitch = int(note.get("pitch", 60))
+                start = float(note.get("start", 0))
+                length = float(note.get("length", 0.5))
+                vel = int(note.get("velocity", 100))
+                chan = int(note.get("channel", 0))
+            except (ValueError, TypeError) as e:
+                return f"Invalid note {i}: {e}"
+            if not 0 <= pitch <= 127:
+                return f"Invalid note {i}: pitch {pitch} out of range (0-127)"
+            if not 1 <= vel <= 127:
+                # A velocity-0 note-on is a note-off
+                return f"Invalid note {i}: velocity {vel} out of range (1-127)"
+            if not 0 <= chan <= 15:
+                return f"Invalid note {i}: channel {chan} out of range (0-15)"
+            if not (math.isfinite(start) and math.isfinite(length)):
+                return f"Invalid note {i}: start and length must be finite"
+            pitches.append(pitch)
+            starts.append(start)
+            lengths.append(length)
+            vels.append(vel)
+            chans.append(chan)
+        args = {
+            "track": track if isinstance(track, str) else int(track),
+            "start_beat": float(start_beat),
+            "length_beats": float(length_beats),
+        }
+        if len(notes) > _PACK_NOTES_OVER:
+            # Five JSON numbers per note are slow for the bridge's decoder;
+            # one base64 string of packed records is a single string scan
+            pack = _NOTE_RECORD.pack
+            try:
+                blob = b"".join(
+                    pack(p, c, round(s * 960), round((s + l) * 960), v)
+                    for p, c, s, l, v in zip(pitches, chans, starts, lengths, vels))
+            except struct.error:
+                return "Invalid notes: positions out of range"
+            args["packed"] = base64.b64encode(blob).decode("ascii")
+        else:
+            args.update(pitches=pitches, starts=starts, lengths=lengths,
+                        vels=vels, chans=chans)
+
+        try:
+            result = await conn.execute_cached("midi.insert", _INSERT_MIDI_LUA, args,
+                                               undo_label="Insert MIDI")
+            if result.get("success"):
+                return result.get("stdout", f"Inserted {len(notes)} notes")
+            return f"Error: {result.get('error', {}).get('message', 'unknown')}"
+        except ConnectionError as e:
+            return f"Error: {e}"
+
+    @mcp.tool()
+    async def read_midi(track: Union[str, int]) -> str:
+        """Read MIDI notes from a track as human-readable text.
+
+        Shows all notes with their pitch (note name), position, duration,
+        velocity, and channel.
+
+        Args:
+            track: Track name or 1-based index
         """
+        conn = get_connection()
 
         try:
-            result = await conn.execute(code)
+            result = await conn.execute_cached("midi.read", _READ_MIDI_LUA,
+                                               track if isinstance(track, str) else int(track))
             if result.get("success"):
                 return result.get("stdout", "No output")
             return f"Error: {result.get('error', {}).get('message', 'unknown')}"
@@ -1,10 +1,23 @@
 """Core scripting tools: run_lua, get_project_state."""
 
+import io
+from typing import Dict, Optional
+
 from mcp.server.fastmcp import FastMCP
 from server.connection import get_connection, ConnectionError
+from server.helpers import format_pan
 from server.script_tracker import get_tracker
 
 
+# GetPlayState() values; 3 is not a state REAPER reports
+_PLAY_STATES = ("Stopped", "Playing", "Paused", None, "Recording", "Recording+Playing")
+
+# FX chain text per track GUID, valid for one project generation (the
+# bridge's state "generation" changes with any project edit)
+_fx_generation: Optional[str] = None
+_fx_strs: Dict[str, str] = {}
+
+
 def register(mcp: FastMCP):
 
     @mcp.tool()
@@ -102,70 +115,85 @@ def register(mcp: FastMCP):
         except ConnectionError as e:
             return f"Connection error: {e}"
 
-        parts = []
+        # Lines go straight into one buffer, each after a "\n" separator
+        buf = io.StringIO()
+        w = buf.write
 
         # Project info
         name = state.get("project_name", "Untitled")
-        parts.append(f"Project: {name}")
+        w(f"Project: {name}")
 
         # Transport
-        play_states = {0: "Stopped", 1: "Playing", 2: "Paused", 4: "Recording", 5: "Recording+Playing"}
         ps = state.get("play_state", 0)
-        parts.append(f"Transport: {play_states.get(ps, f'Unknown ({ps})')}")
+        label = _PLAY_STATES[ps] if type(ps) is int and 0 <= ps < len(_PLAY_STATES) else None
+        w(f"\nTransport: {label or f'Unknown ({ps})'}")
 
         # Tempo
         tempo = state.get("tempo", 120)
         ts = state.get("time_sig", {})
-        parts.append(f"Tempo: {tempo:.1f} BPM, Time sig: {ts.get('numerator', 4)}/{ts.get('denominator', 4)}")
-        parts.append(f"Cursor: {state.get('cursor', 0):.2f}s")
+        w(f"\nTempo: {tempo:.1f} BPM, Time sig: {ts.get('numerator', 4)}/{ts.get('denominator', 4)}")
+        w(f"\nCursor: {state.get('cursor', 0):.2f}s")
 
         # Tracks
         tracks = state.get("tracks", [])
+        global _fx_generation, _fx_strs
+        generation = state.get("generation")
+        if generation is None or generation != _fx_generation:
+            _fx_generation = generation
+            _fx_strs = {}
+        fx_strs = _fx_strs
         if tracks:
-            parts.append(f"\nTracks ({len(tracks)}):")
+            w(f"\n\nTracks ({len(tracks)}):")
             for t in tracks:
+                w("\n  ")
+                w(str(t["index"] + 1))
+                w(". ")
+                w(t["name"])
+                w(f" | {t.get('volume_db', 0):+.1f}dB ")
+                w(format_pan(t.get("pan", 0)))
+
                 flags = []
                 if t.get("mute"): flags.append("MUTE")
                 if t.get("solo"): flags.append("SOLO")
                 if t.get("armed"): flags.append("REC")
-                flag_str = f" [{', '.join(flags)}]" if flags else ""
+                if flags:
+                    w(" [")
+                    w(", ".join(flags))
+                    w("]")
 
-                fx_str = ""
                 if t.get("fx"):
-                    fx_names = [fx["name"] for fx in t["fx"]]
-                    fx_str = f" | FX: {', '.join(fx_names)}"
+                    guid = t.get("guid")
+                    fx_str = fx_strs.get(guid)
+                    if fx_str is None:
+                        fx_str = ", ".join([fx["name"] for fx in t["fx"]])
+                        if guid is not None:
+                            fx_strs[guid] = fx_str
+                    w(" | FX: ")
+                    w(fx_str)
 
-                items_str = ""
                 if t.get("num_items", 0) > 0:
                     midi_items = sum(1 for item in t.get("items", []) if item.get("is_midi"))
                     audio_items = t["num_items"] - midi_items
                     item_parts = []
                     if midi_items: item_parts.append(f"{midi_items} MIDI")
                     if audio_items: item_parts.append(f"{audio_items} audio")
-                    items_str = f" | Items: {', '.join(item_parts)}"
-
-                vol_db = t.get("volume_db", 0)
-                pan = t.get("pan", 0)
-                pan_str = "C" if abs(pan) < 0.01 else f"L{int(abs(pan)*100)}" if pan < 0 else f"R{int(pan*100)}"
-
-                parts.append(
-                    f"  {t['index']+1}. {t['name']} | {vol_db:+.1f}dB {pan_str}{flag_str}{fx_str}{items_str}"
-                )
+                    w(" | Items: ")
+                    w(", ".join(item_parts))
         else:
-            parts.append("\nNo tracks")
+            w("\n\nNo tracks")
 
         # Markers
         markers = state.get("markers", [])
         if markers:
-            parts.append(f"\nMarkers ({len(markers)}):")
+            w(f"\n\nMarkers ({len(markers)}):")
             for m in markers:
-                parts.append(f"  #{m['index']}: {m.get('name', '')} @ {m['position']:.2f}s")
+                w(f"\n  #{m['index']}: {m.get('name', '')} @ {m['position']:.2f}s")
 
         # Regions
         regions = state.get("regions", [])
         if regions:
-            parts.append(f"\nRegions ({len(regions)}):")
+            w(f"\n\nRegions ({len(regions)}):")
             for r in regions:
-                parts.append(f"  #{r['index']}: {r.get('name', '')} ({r['start']:.2f}s - {r['end']:.2f}s)")
+                w(f"\n  #{r['index']}: {r.get('name', '')} ({r['start']:.2f}s - {r['end']:.2f}s)")
 
-        return "\n".join(parts)
+        return buf.getvalue()
@@ -3,6 +3,32 @@
 from mcp.server.fastmcp import FastMCP
 from server.connection import get_connection, ConnectionError
 
+_BRIDGE_MARKER = "reaper-mcp bridge"
+
+# The line boundaries str.splitlines() knows besides "\n"; the scan below
+# works on "\n" only ("\r\n" becomes a blank line, which it skips anyway)
+_ASCII_BREAKS = "\r\v\f\x1c\x1d\x1e"
+_LINE_BREAKS = str.maketrans(dict.fromkeys(_ASCII_BREAKS + "\x85\u2028\u2029", "\n"))
+
+
+def _has_other_startup_code(content: str) -> bool:
+    """True if any non-blank line of content lacks the bridge marker."""
+    if not content.isascii() or any(sep in content for sep in _ASCII_BREAKS):
+        content = content.translate(_LINE_BREAKS)
+    pos = 0
+    while True:
+        idx = content.find(_BRIDGE_MARKER, pos)
+        if idx < 0:
+            return bool(content[pos:].strip())
+        # Anything before the marker's own line?
+        nl = content.rfind("\n", pos, idx)
+        if content[pos:pos if nl < 0 else nl + 1].strip():
+            return True
+        nl = content.find("\n", idx)
+        if nl < 0:
+            return False
+        pos = nl + 1
+
 
 def register(mcp: FastMCP):
 
@@ -44,11 +70,7 @@ def register(mcp: FastMCP):
 
         if action == "status":
             if content:
-                has_other = any(
-                    line.strip() and "reaper-mcp bridge" not in line
-                    for line in content.splitlines()
-                )
-                if has_other:
+                if _has_other_startup_code(content):
                     parts.append(
                         f"File contains other startup code. "
                         f"Review it at: {startup_path}"
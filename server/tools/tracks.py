@@ -1,9 +1,186 @@
-"""Track tools: list, create, delete, volume, pan, mute, solo."""
+"""Track tools: list, create, delete, volume, pan, mute, solo, batch edits."""
 
-from typing import Union
+import io
+from typing import Dict, Optional, Tuple, Union
 from mcp.server.fastmcp import FastMCP
 from server.connection import get_connection, ConnectionError
-from server.helpers import parse_volume, parse_pan, linear_to_db
+from server.helpers import (
+    format_pan, linear_to_db, parse_pan, parse_volume, relative_volume_db
+)
+
+
+# Lua twin of helpers.resolve_track_ref: resolve_track(ref, hint) returns the
+# track and its 0-based index, or nil and the same error message. A hint from
+# an earlier call is trusted while the project generation is unchanged: the
+# bridge reports it with each reply, after closing that call's undo block.
+_RESOLVE_TRACK_LUA = """
+            local function project_generation()
+                local proj = reaper.EnumProjects(-1)
+                return tostring(proj) .. ":" .. reaper.GetProjectStateChangeCount(proj)
+            end
+
+            local function py_list(t)
+                if #t == 0 then return "[]" end
+                return "['" .. table.concat(t, "', '") .. "']"
+            end
+
+            local function resolve_track(ref, hint)
+                if hint and hint.generation == project_generation() then
+                    local tr = reaper.GetTrack(0, hint.index)
+                    if tr then return tr, hint.index end
+                end
+                local count = reaper.CountTracks(0)
+                local function by_index(n)
+                    local idx = n > 0 and n - 1 or n
+                    if idx >= 0 and idx < count then
+                        return reaper.GetTrack(0, idx), idx
+                    end
+                end
+                if type(ref) == "number" then
+                    local tr, idx = by_index(ref)
+                    if tr then return tr, idx end
+                    return nil, string.format("Track index %d out of range (1-%d)", ref, count)
+                end
+
+                local target = ref:match("^%s*(.-)%s*$"):lower()
+                local names, matches = {}, {}
+                for i = 0, count - 1 do
+                    local tr = reaper.GetTrack(0, i)
+                    local _, name = reaper.GetTrackName(tr)
+                    local name_lower = name:lower()
+                    if name_lower == target then return tr, i end
+                    names[i + 1] = name
+                    if name_lower:find(target, 1, true) then
+                        matches[#matches + 1] = i
+                    end
+                end
+                if #matches > 1 then
+                    local found = {}
+                    for k, i in ipairs(matches) do found[k] = names[i + 1] end
+                    return nil, "Ambiguous track reference '" .. ref .. "'. Matches: " .. py_list(found)
+                end
+                if matches[1] then
+                    return reaper.GetTrack(0, matches[1]), matches[1]
+                end
+                if target:match("^[+-]?%d+$") then
+                    local tr, idx = by_index(tonumber(target))
+                    if tr then return tr, idx end
+                end
+                return nil, "No track found matching '" .. ref .. "'. Available: " .. py_list(names)
+            end
+"""
+
+
+# Track ref -> (index, project generation) from the last edit through it
+_track_hints: Dict[Union[str, int], Tuple[int, str]] = {}
+_TRACK_HINTS_MAX = 64
+
+
+def _track_ref(track: Union[str, int]) -> Union[str, int]:
+    return track if isinstance(track, str) else int(track)
+
+
+def _track_args(track: Union[str, int]) -> dict:
+    """resolve_track() arguments for a ref, with a hint if one is cached."""
+    ref = _track_ref(track)
+    args = {"ref": ref}
+    hint = _track_hints.pop(ref, None)
+    if hint:
+        args["hint"] = {"index": hint[0], "generation": hint[1]}
+    return args
+
+
+def _edit_script(body: str) -> str:
+    """Wrap an edit body (sees tr, idx, name and args) in the resolver."""
+    return _RESOLVE_TRACK_LUA + """
+            local args = ...
+            local tr, idx = resolve_track(args.ref, args.hint)
+            if not tr then return {error = idx} end
+            local _, name = reaper.GetTrackName(tr)
+            local res = (function()
+""" + body + """
+            end)()
+            res.index = idx
+            return res
+        """
+
+
+# Built once: execute_cached compares the source on every call, and the
+# same string object compares by identity
+_SET_VOLUME_LUA = _edit_script("""
+                local old = reaper.GetMediaTrackInfo_Value(tr, "D_VOL")
+                local new = args.volume or old * 10 ^ (args.relative_db / 20)
+                reaper.SetMediaTrackInfo_Value(tr, "D_VOL", new)
+                return {name = name, old = old, new = new}
+""")
+
+_SET_PAN_LUA = _edit_script("""
+                reaper.SetMediaTrackInfo_Value(tr, "D_PAN", args.pan)
+                return {name = name}
+""")
+
+_SET_FLAG_LUA = _edit_script("""
+                reaper.SetMediaTrackInfo_Value(tr, args.param, args.value)
+                return {name = name}
+""")
+
+_SET_TRACKS_LUA = _RESOLVE_TRACK_LUA + """
+        local ops = ...
+        local out = {}
+        for i, op in ipairs(ops) do
+            local tr, idx = resolve_track(op.ref, op.hint)
+            if not tr then
+                out[i] = {error = idx}
+            else
+                local _, name = reaper.GetTrackName(tr)
+                local res = {name = name, index = idx}
+                if op.volume or op.relative_db then
+                    local old = reaper.GetMediaTrackInfo_Value(tr, "D_VOL")
+                    local new = op.volume or old * 10 ^ (op.relative_db / 20)
+                    reaper.SetMediaTrackInfo_Value(tr, "D_VOL", new)
+                    res.old, res.new = old, new
+                end
+                if op.pan then reaper.SetMediaTrackInfo_Value(tr, "D_PAN", op.pan) end
+                if op.mute then reaper.SetMediaTrackInfo_Value(tr, "B_MUTE", op.mute) end
+                if op.solo then reaper.SetMediaTrackInfo_Value(tr, "I_SOLO", op.solo) end
+                out[i] = res
+            end
+        end
+        return out
+"""
+
+
+async def _edit_track(key: str, track: Union[str, int], code: str, args: dict,
+                      undo_label: str) -> Union[dict, str]:
+    """Resolve a track and run an _edit_script() against it in one RPC.
+
+    The bridge keeps code compiled under key; the track ref and values
+    travel as args. The script's table is handed back as a dict; a resolve
+    failure or script error comes back as the message string instead.
+    """
+    conn = get_connection()
+    try:
+        result = await conn.execute_cached(key, code, {**args, **_track_args(track)},
+                                           undo_label=undo_label)
+    except ConnectionError as e:
+        return f"Error: {e}"
+    if not result.get("success"):
+        return f"Error: {result.get('error', {}).get('message', 'unknown')}"
+    edit = result.get("result") or {}
+    if "error" in edit:
+        return edit["error"]
+    _remember_track(_track_ref(track), edit, result.get("generation"))
+    return edit
+
+
+def _remember_track(ref: Union[str, int], edit: dict, generation: Optional[str]) -> None:
+    """Cache where ref resolved, if the bridge reported the generation
+    (bridges before 0.4.1 don't, and then no hint is sent)."""
+    if generation is None:
+        return
+    if len(_track_hints) >= _TRACK_HINTS_MAX:
+        _track_hints.clear()
+    _track_hints[ref] = (int(edit["index"]), str(generation))
 
 
 def register(mcp: FastMCP):
@@ -21,25 +198,30 @@ def register(mcp: FastMCP):
         if not tracks:
             return "No tracks in project"
 
-        lines = [f"{len(tracks)} tracks:"]
+        buf = io.StringIO()
+        w = buf.write
+        w(f"{len(tracks)} tracks:")
         for t in tracks:
+            w("\n  ")
+            w(str(t["index"] + 1))
+            w(". ")
+            w(t["name"])
+            w(f" | {t.get('volume_db', 0):+.1f}dB ")
+            w(format_pan(t.get("pan", 0)))
+
             flags = []
             if t.get("mute"): flags.append("M")
             if t.get("solo"): flags.append("S")
             if t.get("armed"): flags.append("R")
-            flag_str = f" [{'/'.join(flags)}]" if flags else ""
-
-            vol_db = t.get("volume_db", 0)
-            pan = t.get("pan", 0)
-            pan_str = "C" if abs(pan) < 0.01 else f"L{int(abs(pan)*100)}" if pan < 0 else f"R{int(pan*100)}"
+            if flags:
+                w(" [")
+                w("/".join(flags))
+                w("]")
 
             fx_count = len(t.get("fx", []))
-            fx_str = f" | {fx_count} FX" if fx_count else ""
-
-            lines.append(
-                f"  {t['index']+1}. {t['name']} | {vol_db:+.1f}dB {pan_str}{flag_str}{fx_str}"
-            )
-        return "\n".join(lines)
+            if fx_count:
+                w(f" | {fx_count} FX")
+        return buf.getvalue()
 
     @mcp.tool()
     async def create_track(name: str, index: int = -1) -> str:
@@ -51,16 +233,17 @@ def register(mcp: FastMCP):
         """
         conn = get_connection()
         try:
-            result = await conn.execute(f"""
+            result = await conn.execute_cached("tracks.create", """
+                local args = ...
                 local count = reaper.CountTracks(0)
-                local idx = {index}
+                local idx = args.index
                 if idx < 0 then idx = count end
                 if idx > 0 then idx = idx - 1 end
                 reaper.InsertTrackAtIndex(idx, true)
                 local track = reaper.GetTrack(0, idx)
-                reaper.GetSetMediaTrackInfo_String(track, "P_NAME", {repr(name)}, true)
-                print("Created track " .. (idx + 1) .. ": " .. {repr(name)})
-            """, undo_label=f"Create track: {name}")
+                reaper.GetSetMediaTrackInfo_String(track, "P_NAME", args.name, true)
+                print("Created track " .. (idx + 1) .. ": " .. args.name)
+            """, {"name": name, "index": int(index)}, undo_label=f"Create track: {name}")
             if result.get("success"):
                 return result.get("stdout", f"Created track: {name}")
             return f"Error: {result.get('error', {}).get('message', 'unknown')}"
@@ -76,32 +259,29 @@ def register(mcp: FastMCP):
         """
         conn = get_connection()
         try:
-            if isinstance(track, int):
-                idx = track - 1
-                result = await conn.execute(f"""
-                    local track = reaper.GetTrack(0, {idx})
+            result = await conn.execute_cached("tracks.delete", """
+                local ref = ...
+                if type(ref) == "number" then
+                    local track = reaper.GetTrack(0, ref - 1)
                     if not track then
-                        print("ERROR: No track at index {track}")
+                        print("ERROR: No track at index " .. ref)
                         return
                     end
                     local _, name = reaper.GetTrackName(track)
                     reaper.DeleteTrack(track)
-                    print("Deleted track {track}: " .. name)
-                """, undo_label="Delete track")
-            else:
-                result = await conn.execute(f"""
-                    local target = ({repr(track)}):lower()
-                    for i = 0, reaper.CountTracks(0) - 1 do
-                        local tr = reaper.GetTrack(0, i)
-                        local _, name = reaper.GetTrackName(tr)
-                        if name:lower():find(target, 1, true) then
-                            reaper.DeleteTrack(tr)
-                            print("Deleted track " .. (i+1) .. ": " .. name)
-                            return
-                        end
-                    end
-                    print("ERROR: No track found matching '" .. ({repr(track)}) .. "'")
-                """, undo_label=f"Delete track: {track}")
+                    print("Deleted track " .. ref .. ": " .. name)
+                    return
+                end
+
+                local tr, i = _resolve_track_by_substring(ref:lower())
+                if not tr then
+                    print("ERROR: No track found matching '" .. ref .. "'")
+                    return
+                end
+                local _, name = reaper.GetTrackName(tr)
+                reaper.DeleteTrack(tr)
+                print("Deleted track " .. (i+1) .. ": " .. name)
+            """, track, undo_label="Delete track" if isinstance(track, int) else f"Delete track: {track}")
 
             if result.get("success"):
                 return result.get("stdout", "Done")
@@ -120,38 +300,25 @@ def register(mcp: FastMCP):
                 - Relative: "+3dB", "-3dB" (relative to current)
                 - Linear: 0.5 (values between -1 and 1 treated as linear)
         """
-        conn = get_connection()
+        # Relative changes are applied to the current volume inside the script
         try:
-            # Get current state to resolve track and current volume
-            state = await conn.get_state()
-            tracks = state.get("tracks", [])
-
-            from server.helpers import resolve_track_ref
-            try:
-                idx = resolve_track_ref(track, tracks)
-            except ValueError as e:
-                return str(e)
-
-            current_linear = tracks[idx]["volume_linear"]
-            try:
-                new_linear = parse_volume(volume, current_linear)
-            except (ValueError, TypeError) as e:
-                return f"Invalid volume: {e}"
-
-            new_db = linear_to_db(new_linear)
-            old_db = tracks[idx]["volume_db"]
-            name = tracks[idx]["name"]
-
-            result = await conn.execute(f"""
-                local track = reaper.GetTrack(0, {idx})
-                reaper.SetMediaTrackInfo_Value(track, "D_VOL", {new_linear})
-            """, undo_label=f"Volume: {name}")
-
-            if result.get("success"):
-                return f"{name}: {old_db:+.1f}dB -> {new_db:+.1f}dB"
-            return f"Error: {result.get('error', {}).get('message', 'unknown')}"
-        except ConnectionError as e:
-            return f"Error: {e}"
+            relative_db = relative_volume_db(volume)
+            new_linear = parse_volume(volume) if relative_db is None else None
+        except (ValueError, TypeError) as e:
+            return f"Invalid volume: {e}"
+
+        if relative_db is None:
+            args = {"volume": float(new_linear)}
+        else:
+            args = {"relative_db": relative_db}
+        edit = await _edit_track("tracks.volume", track, _SET_VOLUME_LUA, args,
+                                 undo_label=f"Volume: {track}")
+        if isinstance(edit, str):
+            return edit
+
+        old_db = linear_to_db(edit["old"])
+        new_db = linear_to_db(edit["new"])
+        return f"{edit['name']}: {old_db:+.1f}dB -> {new_db:+.1f}dB"
 
     @mcp.tool()
     async def set_pan(track: Union[str, int], pan: Union[str, float]) -> str:
@@ -163,34 +330,17 @@ def register(mcp: FastMCP):
                 - Numeric: -1.0 (full left) to 1.0 (full right)
                 - String: "L50" (50% left), "R30" (30% right), "C" (center)
         """
-        conn = get_connection()
         try:
-            state = await conn.get_state()
-            tracks = state.get("tracks", [])
-
-            from server.helpers import resolve_track_ref
-            try:
-                idx = resolve_track_ref(track, tracks)
-            except ValueError as e:
-                return str(e)
-
-            try:
-                pan_val = parse_pan(pan)
-            except (ValueError, TypeError) as e:
-                return f"Invalid pan: {e}"
-
-            name = tracks[idx]["name"]
-            result = await conn.execute(f"""
-                local track = reaper.GetTrack(0, {idx})
-                reaper.SetMediaTrackInfo_Value(track, "D_PAN", {pan_val})
-            """, undo_label=f"Pan: {name}")
-
-            pan_str = "C" if abs(pan_val) < 0.01 else f"L{int(abs(pan_val)*100)}" if pan_val < 0 else f"R{int(pan_val*100)}"
-            if result.get("success"):
-                return f"{name}: pan -> {pan_str}"
-            return f"Error: {result.get('error', {}).get('message', 'unknown')}"
-        except ConnectionError as e:
-            return f"Error: {e}"
+            pan_val = parse_pan(pan)
+        except (ValueError, TypeError) as e:
+            return f"Invalid pan: {e}"
+
+        edit = await _edit_track("tracks.pan", track, _SET_PAN_LUA, {"pan": pan_val},
+                                 undo_label=f"Pan: {track}")
+        if isinstance(edit, str):
+            return edit
+
+        return f"{edit['name']}: pan -> {format_pan(pan_val)}"
 
     @mcp.tool()
     async def mute(track: Union[str, int]) -> str:
@@ -229,26 +379,82 @@ def register(mcp: FastMCP):
         return await _set_flag(track, "I_SOLO", 0, "Unsoloed")
 
 
-    async def _set_flag(track_ref: Union[str, int], param: str, value: int, action: str) -> str:
+    @mcp.tool()
+    async def set_tracks(ops: list) -> str:
+        """Apply several track edits in one call and one undo step.
+
+        Args:
+            ops: List of edit dicts, each with:
+                - track: Track name or 1-based index
+                - volume: optional, same forms as set_volume
+                - pan: optional, same forms as set_pan
+                - mute: optional bool
+                - solo: optional bool
+        """
+        if not ops:
+            return "No track edits given"
+
+        edits = []
+        pans = []
+        for op in ops:
+            if not isinstance(op, dict) or "track" not in op:
+                return f"Invalid edit (needs a 'track'): {op}"
+            edit = _track_args(op["track"])
+            if "volume" in op:
+                try:
+                    relative_db = relative_volume_db(op["volume"])
+                    if relative_db is None:
+                        edit["volume"] = float(parse_volume(op["volume"]))
+                    else:
+                        edit["relative_db"] = relative_db
+                except (ValueError, TypeError) as e:
+                    return f"Invalid volume for {op['track']}: {e}"
+            pan_val = None
+            if "pan" in op:
+                try:
+                    pan_val = parse_pan(op["pan"])
+                except (ValueError, TypeError) as e:
+                    return f"Invalid pan for {op['track']}: {e}"
+                edit["pan"] = pan_val
+            pans.append(pan_val)
+            if "mute" in op:
+                edit["mute"] = 1 if op["mute"] else 0
+            if "solo" in op:
+                edit["solo"] = 2 if op["solo"] else 0
+            edits.append(edit)
+
         conn = get_connection()
         try:
-            state = await conn.get_state()
-            tracks = state.get("tracks", [])
+            result = await conn.execute_cached("tracks.set_tracks", _SET_TRACKS_LUA, edits,
+                                               undo_label=f"Edit {len(ops)} tracks")
+        except ConnectionError as e:
+            return f"Error: {e}"
+        if not result.get("success"):
+            return f"Error: {result.get('error', {}).get('message', 'unknown')}"
 
-            from server.helpers import resolve_track_ref
-            try:
-                idx = resolve_track_ref(track_ref, tracks)
-            except ValueError as e:
-                return str(e)
+        lines = []
+        for op, pan_val, edit in zip(ops, pans, result.get("result") or []):
+            if "error" in edit:
+                lines.append(edit["error"])
+                continue
+            _remember_track(_track_ref(op["track"]), edit, result.get("generation"))
+            changes = []
+            if "old" in edit:
+                changes.append(f"{linear_to_db(edit['old']):+.1f}dB -> {linear_to_db(edit['new']):+.1f}dB")
+            if pan_val is not None:
+                changes.append(f"pan -> {format_pan(pan_val)}")
+            if "mute" in op:
+                changes.append("muted" if op["mute"] else "unmuted")
+            if "solo" in op:
+                changes.append("soloed" if op["solo"] else "unsoloed")
+            lines.append(f"{edit['name']}: {', '.join(changes) or 'no changes'}")
+        return "\n".join(lines)
 
-            name = tracks[idx]["name"]
-            result = await conn.execute(f"""
-                local track = reaper.GetTrack(0, {idx})
-                reaper.SetMediaTrackInfo_Value(track, "{param}", {value})
-            """, undo_label=f"{action}: {name}")
 
-            if result.get("success"):
-                return f"{action}: {name}"
-            return f"Error: {result.get('error', {}).get('message', 'unknown')}"
-        except ConnectionError as e:
-            return f"Error: {e}"
+    async def _set_flag(track_ref: Union[str, int], param: str, value: int, action: str) -> str:
+        edit = await _edit_track("tracks.flag", track_ref, _SET_FLAG_LUA,
+                                 {"param": param, "value": value},
+                                 undo_label=f"{action}: {track_ref}")
+        if isinstance(edit, str):
+            return edit
+        return f"{action}: {edit['name']}"
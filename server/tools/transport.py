@@ -11,7 +11,7 @@ def register(mcp: FastMCP):
         """Start playback in REAPER."""
         conn = get_connection()
         try:
-            await conn.execute("reaper.Main_OnCommand(1007, 0)")  # Transport: Play
+            await conn.execute_cached("xport.play", "reaper.Main_OnCommand(1007, 0)")  # Transport: Play
             return "Playing"
         except ConnectionError as e:
             return f"Error: {e}"
@@ -21,7 +21,7 @@ def register(mcp: FastMCP):
         """Stop playback/recording in REAPER."""
         conn = get_connection()
         try:
-            await conn.execute("reaper.Main_OnCommand(1016, 0)")  # Transport: Stop
+            await conn.execute_cached("xport.stop", "reaper.Main_OnCommand(1016, 0)")  # Transport: Stop
             return "Stopped"
         except ConnectionError as e:
             return f"Error: {e}"
@@ -31,7 +31,7 @@ def register(mcp: FastMCP):
         """Start recording in REAPER. Make sure a track is armed first."""
         conn = get_connection()
         try:
-            await conn.execute("reaper.Main_OnCommand(1013, 0)")  # Transport: Record
+            await conn.execute_cached("xport.record", "reaper.Main_OnCommand(1013, 0)")  # Transport: Record
             return "Recording"
         except ConnectionError as e:
             return f"Error: {e}"
@@ -47,11 +47,12 @@ def register(mcp: FastMCP):
             return f"BPM must be between 20 and 960, got {bpm}"
         conn = get_connection()
         try:
-            result = await conn.execute(f"""
+            result = await conn.execute_cached("xport.set_tempo", """
+                local bpm = ...
                 local old = reaper.Master_GetTempo()
-                reaper.SetCurrentBPM(0, {bpm}, true)
-                return string.format("%.1f -> %.1f BPM", old, {bpm})
-            """)
+                reaper.SetCurrentBPM(0, bpm, true)
+                return string.format("%.1f -> %.1f BPM", old, bpm)
+            """, args=float(bpm))
             if result.get("success"):
                 return result.get("stdout", "") or result.get("result", f"Tempo set to {bpm} BPM")
             return f"Error: {result.get('error', {}).get('message', 'unknown')}"
@@ -63,7 +64,7 @@ def register(mcp: FastMCP):
         """Get the current tempo and time signature."""
         conn = get_connection()
         try:
-            result = await conn.execute("""
+            result = await conn.execute_cached("xport.get_tempo", """
                 local tempo = reaper.Master_GetTempo()
                 local ts_num, ts_den = reaper.TimeMap_GetTimeSigAtTime(0, 0)
                 print(string.format("%.1f BPM, %d/%d time signature", tempo, ts_num, ts_den))
@@ -1,7 +1,9 @@
 """Tests for server/api_index.py"""
 
 import pytest
-from server.api_index import APIIndex, _infer_category, _parse_signature
+from server.api_index import (
+    APIIndex, DOCS_PATH, ReaScriptHTMLParser, _infer_category, _parse_signature
+)
 
 
 class TestInferCategory:
@@ -36,11 +38,55 @@ class TestParseSignature:
         assert isinstance(ret, str)
 
 
+# The docs file is large; read and parse it once for the whole module
+@pytest.fixture(scope="module")
+def docs_html():
+    with open(DOCS_PATH, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="module")
+def docs_functions(docs_html):
+    parser = ReaScriptHTMLParser()
+    parser.feed(docs_html)
+    parser.close()
+    return parser.functions
+
+
+class TestDocsParser:
+    def test_lxml_matches_html_parser(self, docs_html, docs_functions):
+        pytest.importorskip("lxml")
+        from server.api_index import LxmlReaScriptParser
+
+        fast = LxmlReaScriptParser()
+        fast.feed(docs_html)
+        fast.close()
+
+        assert fast.functions == docs_functions
+
+    def test_chunked_feed_matches_whole(self, docs_html, docs_functions):
+        chunked = ReaScriptHTMLParser()
+        for i in range(0, len(docs_html), 4096):
+            chunked.feed(docs_html[i:i + 4096])
+        chunked.close()
+
+        assert chunked.functions == docs_functions
+
+
 class TestAPIIndex:
     @pytest.fixture
-    def index(self, tmp_path):
-        db_path = str(tmp_path / "test_api.db")
-        return APIIndex(db_path=db_path)
+    def index(self):
+        index = APIIndex(db_path=":memory:")
+        yield index
+        index.close()
+
+    def test_file_connection_reused_and_tuned(self, tmp_path):
+        index = APIIndex(db_path=str(tmp_path / "test_api.db"))
+        conn = index._connect()
+        assert index._connect() is conn
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA mmap_size").fetchone()[0] == 268435456
+        index.close()
 
     def test_empty_index(self, index):
         assert not index.is_indexed
@@ -56,3 +102,95 @@ class TestAPIIndex:
     def test_search_categories(self, index):
         cats = index.list_categories()
         assert isinstance(cats, list)
+
+    def test_build_index_rebuild(self, index):
+        count = index.build_index()
+        assert count > 0
+        # Rebuilding replaces rather than duplicates
+        assert index.build_index() == count
+        assert index.get_function("MIDI_InsertNote") is not None
+        assert len(index.search("MIDI_InsertNote", limit=50)) >= 1
+
+    def test_build_index_dedups_names(self, index, tmp_path, docs_html):
+        doubled = tmp_path / "doubled.html"
+        doubled.write_text(docs_html + docs_html, encoding="utf-8")
+        assert index.build_index(str(doubled)) == index.build_index()
+
+    def test_substring_fallback_inside_names(self, index):
+        if not index._trigram:
+            pytest.skip("SQLite without the trigram tokenizer")
+        index.build_index()
+        names = [r.name for r in index.search("NoteName")]
+        assert "GetTrackMIDINoteName" in names
+        assert all("notename" in n.lower() for n in names)
+        index.mark_available(["XYZ_RuntimeOnlyFunc"])
+        assert [r.name for r in index.search("ntimeOnly", available_only=True)] == \
+            ["XYZ_RuntimeOnlyFunc"]
+
+    def test_name_index_backfilled_on_old_database(self, tmp_path):
+        db_path = str(tmp_path / "old_api.db")
+        old = APIIndex(db_path=db_path)
+        if not old._trigram:
+            pytest.skip("SQLite without the trigram tokenizer")
+        old.build_index()
+        conn = old._connect()
+        for trigger in ("api_names_ai", "api_names_ad", "api_names_au"):
+            conn.execute(f"DROP TRIGGER {trigger}")
+        conn.execute("DROP TABLE api_names")
+        old.close()
+
+        index = APIIndex(db_path=db_path)
+        assert "GetTrackMIDINoteName" in [r.name for r in index.search("NoteName")]
+        index.close()
+
+    def test_fts_update_trigger_narrowed_on_old_database(self, tmp_path):
+        db_path = str(tmp_path / "old_api.db")
+        old = APIIndex(db_path=db_path)
+        conn = old._connect()
+        conn.executescript("""
+            DROP TRIGGER api_au;
+            CREATE TRIGGER api_au AFTER UPDATE ON api_functions BEGIN
+                INSERT INTO api_fts(api_fts, rowid, name, signature, description, category)
+                VALUES('delete', old.rowid, old.name, old.signature, old.description, old.category);
+                INSERT INTO api_fts(rowid, name, signature, description, category)
+                VALUES (new.rowid, new.name, new.signature, new.description, new.category);
+            END;
+        """)
+        old.close()
+
+        index = APIIndex(db_path=db_path)
+        sql = index._connect().execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'api_au'").fetchone()[0]
+        assert "UPDATE OF name, signature, description, category" in sql
+        index.mark_available(["XYZ_RuntimeOnlyFunc"])
+        index.mark_available([])
+        assert [r.name for r in index.search("XYZ_RuntimeOnlyFunc")] == ["XYZ_RuntimeOnlyFunc"]
+        index.close()
+
+    def test_triggers_restored_after_build(self, index):
+        index.build_index()
+        # Rows added after a bulk build must still reach the FTS index
+        index.mark_available(["MIDI_InsertNote", "XYZ_RuntimeOnlyFunc"])
+        results = index.search("XYZ_RuntimeOnlyFunc", available_only=True)
+        assert [r.name for r in results] == ["XYZ_RuntimeOnlyFunc"]
+
+    def test_mark_available_resets_previous(self, index):
+        index.mark_available(["MIDI_InsertNote", "CF_GetClipboard"])
+        index.mark_available(["CF_GetClipboard"])
+        assert index.search("MIDI", available_only=True) == []
+        assert len(index.search("CF_GetClipboard", available_only=True)) == 1
+
+    def test_search_cache_invalidated_by_writes(self, index):
+        assert index.search("CF_GetClipboard", available_only=True) == []
+        index.mark_available(["CF_GetClipboard"])
+        assert len(index.search("  cf_getclipboard ", available_only=True)) == 1
+        # Same normalized query is served from the cache
+        index.search("CF_GetClipboard", available_only=True)
+        assert index._search_cached.cache_info().hits >= 1
+
+    def test_cached_results_are_immutable(self, index):
+        index.mark_available(["GetTrack"])
+        func = index.search("GetTrack")[0]
+        with pytest.raises(AttributeError):
+            func.name = "Other"
+        assert not hasattr(func, "__dict__")
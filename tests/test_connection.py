@@ -1,7 +1,8 @@
 """Tests for server/connection.py"""
 
+import asyncio
 import pytest
-from server.connection import ReaperConnection, ConnectionError
+from server.connection import ReaperConnection, ConnectionError, _dumps, _loads
 
 
 class TestReaperConnection:
@@ -16,7 +17,220 @@ class TestReaperConnection:
         assert conn.port == 9999
 
     @pytest.mark.asyncio
-    async def test_connect_fails_no_server(self):
-        conn = ReaperConnection(port=19999)  # unlikely to be in use
+    async def test_connect_fails_no_server(self, monkeypatch):
+        # Refuse without touching a real port (slow to refuse on Windows,
+        # and a parallel run could have something listening there)
+        async def refuse(*args, **kwargs):
+            raise ConnectionRefusedError()
+
+        monkeypatch.setattr(asyncio, "open_connection", refuse)
+        conn = ReaperConnection(port=19999)
         with pytest.raises(ConnectionError, match="Cannot connect"):
             await conn.connect()
+
+
+class TestCodec:
+    def test_roundtrip(self):
+        msg = {"method": "exec", "params": {"code": "print('é')"}, "id": 1}
+        assert _loads(_dumps(msg)) == msg
+
+    def test_bridge_infinity(self):
+        # The Lua bridge encodes -inf dB volumes as -1e999
+        assert _loads(b'{"volume_db": -1e999}\n')["volume_db"] == float("-inf")
+
+
+class FakeBridge:
+    """Minimal stand-in for lua/bridge.lua on an ephemeral port."""
+
+    def __init__(self, handler, framing=None):
+        self.handler = handler
+        self.framing = framing  # None = old bridge without hello
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        hello = _loads(await reader.readline())
+        if self.framing:
+            reply = {"result": {"version": "test", "framing": self.framing}, "id": hello["id"]}
+        else:
+            reply = {"error": {"message": "Unknown method: hello"}, "id": hello["id"]}
+        writer.write(_dumps(reply) + b"\n")
+        await writer.drain()
+        self.framed = self.framing == "length"
+        await self.handler(self, reader, writer)
+
+    async def recv(self, reader):
+        if self.framed:
+            size = int.from_bytes(await reader.readexactly(4), "big")
+            return _loads(await reader.readexactly(size))
+        return _loads(await reader.readline())
+
+    def send(self, writer, msg):
+        body = _dumps(msg)
+        if self.framed:
+            writer.write(len(body).to_bytes(4, "big") + body)
+        else:
+            writer.write(body + b"\n")
+
+
+async def _reverse_two(bridge, reader, writer):
+    # Answer the first two requests in reverse order
+    first = await bridge.recv(reader)
+    second = await bridge.recv(reader)
+    for req in (second, first):
+        bridge.send(writer, {"result": req["params"]["tag"], "error": None, "id": req["id"]})
+    await writer.drain()
+    await reader.read()
+    writer.close()
+
+
+class TestPipelining:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("framing", [None, "length"])
+    async def test_responses_matched_by_id(self, framing):
+        async with FakeBridge(_reverse_two, framing) as bridge:
+            conn = ReaperConnection(port=bridge.port)
+            try:
+                results = await asyncio.gather(
+                    conn.request("exec", {"tag": "a"}),
+                    conn.request("exec", {"tag": "b"}),
+                )
+                assert results == ["a", "b"]
+                assert conn._framed == (framing == "length")
+            finally:
+                await conn.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_pending_failed_when_bridge_disconnects(self):
+        async def hang_up(bridge, reader, writer):
+            await bridge.recv(reader)
+            writer.close()
+
+        async with FakeBridge(hang_up, "length") as bridge:
+            conn = ReaperConnection(port=bridge.port)
+            try:
+                with pytest.raises(ConnectionError, match="closed"):
+                    await conn.request("ping", timeout=5)
+                assert not conn.connected
+            finally:
+                await conn.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_execute_batch_results_in_order(self):
+        async def echo_codes(bridge, reader, writer):
+            reqs = [await bridge.recv(reader) for _ in range(3)]
+            for req in reversed(reqs):
+                result = {"success": True, "result": req["params"]["code"]}
+                bridge.send(writer, {"result": result, "error": None, "id": req["id"]})
+            await writer.drain()
+            await reader.read()
+            writer.close()
+
+        async with FakeBridge(echo_codes, "length") as bridge:
+            conn = ReaperConnection(port=bridge.port)
+            try:
+                results = await conn.execute_batch(["return 1", "return 2", "return 3"])
+                assert [r["result"] for r in results] == ["return 1", "return 2", "return 3"]
+                assert conn._pending == {}
+            finally:
+                await conn.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_request_many_raises_on_error(self):
+        async def fail_second(bridge, reader, writer):
+            first = await bridge.recv(reader)
+            second = await bridge.recv(reader)
+            bridge.send(writer, {"result": "ok", "error": None, "id": first["id"]})
+            bridge.send(writer, {"error": {"message": "Unknown method: nope"}, "id": second["id"]})
+            await writer.drain()
+            await reader.read()
+            writer.close()
+
+        async with FakeBridge(fail_second) as bridge:
+            conn = ReaperConnection(port=bridge.port)
+            try:
+                with pytest.raises(ConnectionError, match="Unknown method"):
+                    await conn.request_many([("ping", None), ("nope", None)])
+            finally:
+                await conn.disconnect()
+
+
+class TestExecuteCached:
+    @staticmethod
+    def _cached_bridge(log):
+        async def handler(bridge, reader, writer):
+            scripts = {}
+            while True:
+                try:
+                    req = await bridge.recv(reader)
+                except (asyncio.IncompleteReadError, ValueError):
+                    break
+                params = req["params"]
+                log.append(params)
+                if "code" in params:
+                    scripts[params["key"]] = params["code"]
+                if params["key"] in scripts:
+                    result = {"success": True, "result": [scripts[params["key"]], params.get("args")]}
+                else:
+                    result = {"missing": True}
+                bridge.send(writer, {"result": result, "error": None, "id": req["id"]})
+                await writer.drain()
+            writer.close()
+        return handler
+
+    @pytest.mark.asyncio
+    async def test_source_sent_once(self):
+        log = []
+        async with FakeBridge(self._cached_bridge(log), "length") as bridge:
+            conn = ReaperConnection(port=bridge.port)
+            try:
+                first = await conn.execute_cached("k", "return ...", args=1)
+                second = await conn.execute_cached("k", "return ...", args=2)
+                assert first["result"] == ["return ...", 1]
+                assert second["result"] == ["return ...", 2]
+                assert ["code" in p for p in log] == [True, False]
+            finally:
+                await conn.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_missing_key_resends_source(self):
+        log = []
+        async with FakeBridge(self._cached_bridge(log), "length") as bridge:
+            conn = ReaperConnection(port=bridge.port)
+            try:
+                conn._cached_sources["k"] = "return 1"  # as if sent before a bridge reload
+                result = await conn.execute_cached("k", "return 1")
+                assert result["result"] == ["return 1", None]
+                assert ["code" in p for p in log] == [False, True]
+            finally:
+                await conn.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_old_bridge_falls_back_to_exec(self):
+        async def old_bridge(bridge, reader, writer):
+            req = await bridge.recv(reader)
+            assert req["method"] == "exec_cached"
+            bridge.send(writer, {"error": {"message": "Unknown method: exec_cached"}, "id": req["id"]})
+            req = await bridge.recv(reader)
+            assert req["method"] == "exec"
+            bridge.send(writer, {"result": {"success": True, "result": req["params"]["code"]},
+                                 "error": None, "id": req["id"]})
+            await writer.drain()
+            await reader.read()
+            writer.close()
+
+        async with FakeBridge(old_bridge) as bridge:
+            conn = ReaperConnection(port=bridge.port)
+            try:
+                result = await conn.execute_cached("k", "return ...", args={"bpm": 120})
+                assert result["result"] == 'return (function(...)\nreturn ...\nend)({["bpm"] = 120})'
+                assert conn._exec_cached is False
+            finally:
+                await conn.disconnect()
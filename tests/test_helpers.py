@@ -3,7 +3,8 @@
 import math
 import pytest
 from server.helpers import (
-    db_to_linear, linear_to_db, parse_volume, parse_pan, resolve_track_ref
+    db_to_linear, format_pan, linear_to_db, lua_literal, parse_volume, parse_pan,
+    relative_volume_db, resolve_track_ref, TrackIndex
 )
 
 
@@ -21,6 +22,10 @@ class TestDbConversion:
         for db in [-12, -6, 0, 3, 6, 12]:
             assert linear_to_db(db_to_linear(db)) == pytest.approx(db, abs=0.01)
 
+    def test_table_matches_formula(self):
+        for db in [-120, -60, -6, -6.0, 0, 24, 25, -121, -4.5]:
+            assert db_to_linear(db) == 10 ** (db / 20)
+
     def test_zero_linear_is_neg_inf(self):
         assert linear_to_db(0) == float('-inf')
 
@@ -42,6 +47,34 @@ class TestParseVolume:
         result = parse_volume("-3dB", current)
         assert linear_to_db(result) == pytest.approx(-3.0, abs=0.1)
 
+    def test_negative_db_suffix_is_relative(self):
+        result = parse_volume("-3dB", db_to_linear(-6))
+        assert linear_to_db(result) == pytest.approx(-9.0, abs=0.1)
+
+    def test_repeated_relative_string_follows_current(self):
+        assert linear_to_db(parse_volume("+2dB", db_to_linear(-10))) == pytest.approx(-8.0)
+        assert linear_to_db(parse_volume("+2dB", db_to_linear(-4))) == pytest.approx(-2.0)
+
+    def test_minus_inf_db_is_silence(self):
+        assert parse_volume("-inf dB", db_to_linear(-6)) == 0.0
+        assert relative_volume_db("-inf dB") == float("-inf")
+
+    def test_exponent_with_plus_is_relative(self):
+        result = parse_volume("+1e1", db_to_linear(-4))
+        assert linear_to_db(result) == pytest.approx(6.0)
+        assert relative_volume_db("+1e1") == 10.0
+
+    def test_space_after_sign_rejected(self):
+        with pytest.raises(ValueError):
+            parse_volume("+ 3")
+
+    def test_bare_negative_is_absolute_db(self):
+        assert parse_volume("-6", db_to_linear(-12)) == pytest.approx(db_to_linear(-6))
+
+    def test_invalid_string(self):
+        with pytest.raises(ValueError):
+            parse_volume("loud")
+
     def test_linear_float(self):
         assert parse_volume(0.5) == pytest.approx(0.5)
 
@@ -60,6 +93,45 @@ class TestParseVolume:
         assert linear_to_db(result) == pytest.approx(3.0, abs=0.1)
 
 
+class TestFormatPan:
+    def test_center(self):
+        assert format_pan(0) == "C"
+        assert format_pan(0.005) == "C"
+
+    def test_sides_truncate(self):
+        assert format_pan(-0.5) == "L50"
+        assert format_pan(0.309) == "R30"
+        assert format_pan(-1.0) == "L100"
+
+    def test_roundtrips_parse_pan(self):
+        for label in ("L25", "C", "R70"):
+            assert format_pan(parse_pan(label)) == label
+
+
+class TestRelativeVolumeDb:
+    def test_relative_strings(self):
+        assert relative_volume_db("+3dB") == 3.0
+        assert relative_volume_db("+3") == 3.0
+        assert relative_volume_db("-3 dB") == -3.0
+
+    def test_relative_dict(self):
+        assert relative_volume_db({"relative_db": -2}) == -2.0
+
+    def test_absolute_values(self):
+        for value in (-6, 0.5, "-6", "0dB", "0.5", {"db": -6}, {"linear": 0.5}):
+            assert relative_volume_db(value) is None
+
+    def test_surrounding_whitespace(self):
+        assert relative_volume_db("  +3dB ") == 3.0
+        assert relative_volume_db("  -6 ") is None
+
+    def test_matches_parse_volume(self):
+        current = db_to_linear(-6)
+        for value in ("+3dB", "-3dB", {"relative_db": 4}):
+            expected = parse_volume(value, current)
+            assert current * db_to_linear(relative_volume_db(value)) == pytest.approx(expected)
+
+
 class TestParsePan:
     def test_center_string(self):
         assert parse_pan("C") == 0.0
@@ -70,6 +142,13 @@ class TestParsePan:
     def test_right(self):
         assert parse_pan("R30") == pytest.approx(0.3)
 
+    def test_center_word_and_lowercase(self):
+        assert parse_pan("center") == 0.0
+        assert parse_pan("l25") == pytest.approx(-0.25)
+
+    def test_numeric_string(self):
+        assert parse_pan("-0.4") == pytest.approx(-0.4)
+
     def test_numeric(self):
         assert parse_pan(-0.7) == pytest.approx(-0.7)
 
@@ -77,6 +156,14 @@ class TestParsePan:
         assert parse_pan(5.0) == 1.0
         assert parse_pan(-5.0) == -1.0
 
+    def test_signed_side_tails(self):
+        assert parse_pan("R+30") == pytest.approx(0.3)
+        assert parse_pan("L-50") == pytest.approx(0.5)
+
+    def test_exponent_side_tails(self):
+        assert parse_pan("L1e1") == pytest.approx(-0.1)
+        assert parse_pan("r07e2") == pytest.approx(7.0)
+
 
 class TestResolveTrackRef:
     TRACKS = [
@@ -103,10 +190,78 @@ class TestResolveTrackRef:
         with pytest.raises(ValueError, match="Ambiguous"):
             resolve_track_ref("Guitar", self.TRACKS)
 
+    def test_ambiguous_lists_every_match(self):
+        tracks = self.TRACKS + [{"name": "Acoustic Guitar", "index": 4}]
+        with pytest.raises(ValueError, match="Acoustic Guitar"):
+            resolve_track_ref("guitar", tracks)
+
     def test_not_found(self):
         with pytest.raises(ValueError, match="No track found"):
             resolve_track_ref("Piano", self.TRACKS)
 
+    def test_duplicate_names_first_wins(self):
+        tracks = [{"name": "Vox", "index": 0}, {"name": "vox", "index": 1}]
+        assert resolve_track_ref("VOX", tracks) == 0
+
+    def test_new_track_list_not_served_from_cache(self):
+        assert resolve_track_ref("Drums", self.TRACKS) == 0
+        renamed = [dict(t, name="Kit" if t["index"] == 0 else t["name"]) for t in self.TRACKS]
+        assert resolve_track_ref("Kit", renamed) == 0
+        with pytest.raises(ValueError, match="No track found"):
+            resolve_track_ref("Drums", renamed)
+
+    def test_rename_in_place_not_served_from_cache(self):
+        tracks = [dict(t) for t in self.TRACKS]
+        assert resolve_track_ref("Drums", tracks) == 0
+        tracks[0]["name"] = "Keys"
+        assert resolve_track_ref("keys", tracks) == 0
+        with pytest.raises(ValueError, match="No track found"):
+            resolve_track_ref("Drums", tracks)
+
     def test_index_out_of_range(self):
         with pytest.raises(ValueError, match="out of range"):
             resolve_track_ref(10, self.TRACKS)
+
+    def test_partial_match_never_spans_two_names(self):
+        tracks = [{"name": "Kick", "index": 0}, {"name": "Snare", "index": 1}]
+        assert resolve_track_ref("are", tracks) == 1
+        with pytest.raises(ValueError, match="No track found"):
+            resolve_track_ref("ksn", tracks)
+
+    def test_track_index_resolves_like_the_list(self):
+        index = TrackIndex(self.TRACKS)
+        assert resolve_track_ref("Bass", index) == 1
+        assert resolve_track_ref(3, index) == 2
+        with pytest.raises(ValueError, match="Ambiguous"):
+            resolve_track_ref("Guitar", index)
+
+    def test_large_track_index_uses_trigrams(self):
+        tracks = [{"name": f"Track {i}", "index": i} for i in range(300)]
+        tracks.append({"name": "Backing Vocals", "index": 300})
+        index = TrackIndex(tracks)
+        assert resolve_track_ref("vocal", index) == 300
+        assert resolve_track_ref("ck 299", index) == 299
+        with pytest.raises(ValueError, match="No track found"):
+            resolve_track_ref("ack 0 t", index)
+        with pytest.raises(ValueError, match="Ambiguous"):
+            resolve_track_ref("ack 29", index)
+
+
+class TestLuaLiteral:
+    def test_scalars(self):
+        assert lua_literal(None) == "nil"
+        assert lua_literal(True) == "true"
+        assert lua_literal(3) == "3"
+        assert lua_literal(-2.5) == "-2.5"
+        assert lua_literal(float("-inf")) == "-math.huge"
+
+    def test_string_escapes(self):
+        assert lua_literal('a"b\\c\n]]') == '"a\\034b\\092c\\010]]"'
+
+    def test_tables(self):
+        assert lua_literal([1, "x"]) == '{1, "x"}'
+        assert lua_literal({"bpm": 120}) == '{["bpm"] = 120}'
+
+    def test_unsupported(self):
+        with pytest.raises(TypeError):
+            lua_literal(object())
@@ -0,0 +1,88 @@
+"""Tests for server/tools/midi.py"""
+
+import base64
+import pytest
+
+pytest.importorskip("mcp.server.fastmcp")
+
+from server.tools import midi
+
+
+class _Tools:
+    """Collects the functions register() decorates, by name."""
+
+    def tool(self):
+        def decorator(fn):
+            setattr(self, fn.__name__, fn)
+            return fn
+        return decorator
+
+
+class _Conn:
+    def __init__(self):
+        self.calls = []
+
+    async def execute_cached(self, key, code, args=None, undo_label=None):
+        self.calls.append((key, args))
+        return {"success": True, "stdout": "ok"}
+
+
+@pytest.fixture
+def tools(monkeypatch):
+    conn = _Conn()
+    monkeypatch.setattr(midi, "get_connection", lambda: conn)
+    tools = _Tools()
+    midi.register(tools)
+    tools.conn = conn
+    return tools
+
+
+def _notes(count):
+    return [{"pitch": 36 + i % 60, "start": i * 0.25, "length": 0.125 + (i % 4) * 0.5,
+             "velocity": 1 + i % 127, "channel": i % 16} for i in range(count)]
+
+
+class TestInsertMidi:
+    @pytest.mark.asyncio
+    async def test_small_lists_sent_as_columns(self, tools):
+        assert await tools.insert_midi("keys", 1, 4, _notes(3)) == "ok"
+        args = tools.conn.calls[0][1]
+        assert "packed" not in args
+        assert args["pitches"] == [36, 37, 38]
+        assert args["vels"] == [1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_large_lists_round_trip_through_packed_records(self, tools):
+        notes = _notes(midi._PACK_NOTES_OVER + 88)
+        assert await tools.insert_midi(2, 5, 200, notes) == "ok"
+        args = tools.conn.calls[0][1]
+        assert "pitches" not in args
+        blob = base64.b64decode(args["packed"])
+        assert len(blob) == len(notes) * midi._NOTE_RECORD.size
+        expected = [(n["pitch"], n["channel"], round(n["start"] * 960),
+                     round((n["start"] + n["length"]) * 960), n["velocity"]) for n in notes]
+        assert list(midi._NOTE_RECORD.iter_unpack(blob)) == expected
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("note, message", [
+        ({"velocity": 0}, "Invalid note 1: velocity 0 out of range (1-127)"),
+        ({"velocity": 128}, "Invalid note 1: velocity 128 out of range (1-127)"),
+        ({"pitch": -1}, "Invalid note 1: pitch -1 out of range (0-127)"),
+        ({"channel": 16}, "Invalid note 1: channel 16 out of range (0-15)"),
+        ({"start": float("inf")}, "Invalid note 1: start and length must be finite"),
+    ])
+    async def test_rejects_out_of_range_fields(self, tools, note, message):
+        assert await tools.insert_midi("keys", 1, 4, [note]) == message
+        assert tools.conn.calls == []
+
+    @pytest.mark.asyncio
+    async def test_rejects_non_dict_note(self, tools):
+        result = await tools.insert_midi("keys", 1, 4, [{"pitch": 60}, 60])
+        assert result == "Invalid note 2: expected a dict, got 60"
+
+    @pytest.mark.asyncio
+    async def test_rejects_ticks_past_packed_range(self, tools):
+        notes = _notes(midi._PACK_NOTES_OVER + 1)
+        notes[-1]["start"] = 2.5e6  # 2.4e9 ticks: past a signed 32-bit int
+        assert await tools.insert_midi("keys", 1, 4, notes) == "Invalid notes: positions out of range"
+        assert tools.conn.calls == []
@@ -1,15 +1,28 @@
 """Tests for server/script_tracker.py"""
 
 import os
+import sqlite3
 import tempfile
+import threading
+import time
 import pytest
+from server import script_tracker
 from server.script_tracker import ScriptTracker
 
 
 @pytest.fixture
-def tracker(tmp_path):
+def tracker():
+    tracker = ScriptTracker(db_path=":memory:")
+    yield tracker
+    tracker.close()
+
+
+@pytest.fixture
+def file_tracker(tmp_path):
     db_path = str(tmp_path / "test_scripts.db")
-    return ScriptTracker(db_path=db_path)
+    tracker = ScriptTracker(db_path=db_path)
+    yield tracker
+    tracker.close()
 
 
 class TestScriptTracker:
@@ -23,6 +36,18 @@ class TestScriptTracker:
         h2 = ScriptTracker.hash_code("print('world')")
         assert h1 != h2
 
+    def test_hash_cached_for_repeats(self):
+        code = "reaper.Main_OnCommand(40044, 0) -- cached"
+        ScriptTracker.hash_code(code)
+        before = script_tracker._hash_code.cache_info().hits
+        ScriptTracker.hash_code(code)
+        assert script_tracker._hash_code.cache_info().hits == before + 1
+
+    def test_hash_is_64_hex_chars(self):
+        h = ScriptTracker.hash_code("print('hello')")
+        assert len(h) == 64
+        int(h, 16)
+
     def test_record_and_retrieve(self, tracker):
         code = "print('test')"
         code_hash = tracker.record_execution(code, 10.5, True)
@@ -36,14 +61,27 @@ class TestScriptTracker:
 
     def test_duplicate_increments_count(self, tracker):
         code = "print('test')"
-        h1 = tracker.record_execution(code, 10.0, True)
-        h2 = tracker.record_execution(code, 15.0, True)
+        with tracker.transaction():
+            h1 = tracker.record_execution(code, 10.0, True)
+            h2 = tracker.record_execution(code, 15.0, True)
         assert h1 == h2
 
         script = tracker.get_script(h1)
         assert script.run_count == 2
         assert script.total_elapsed_ms == pytest.approx(25.0)
 
+    def test_repeat_object_reuses_hash(self, tracker, monkeypatch):
+        code = "print('again')"
+        first = tracker.record_execution(code, 1.0, True)
+        monkeypatch.setattr(ScriptTracker, "hash_code",
+                            staticmethod(lambda c: pytest.fail("rehashed")))
+        assert tracker.record_execution(code, 1.0, True) == first
+
+    def test_different_string_hashed(self, tracker):
+        h1 = tracker.record_execution("".join(["x", "()"]), 1.0, True)
+        h2 = tracker.record_execution("".join(["y", "()"]), 1.0, True)
+        assert h1 != h2
+
     def test_error_tracking(self, tracker):
         code = "bad code"
         tracker.record_execution(code, 1.0, False, error="syntax error")
@@ -53,9 +91,10 @@ class TestScriptTracker:
         assert script.last_error == "syntax error"
 
     def test_history(self, tracker):
-        tracker.record_execution("print(1)", 5.0, True)
-        tracker.record_execution("print(2)", 10.0, True)
-        tracker.record_execution("print(3)", 15.0, False, "err")
+        with tracker.transaction():
+            tracker.record_execution("print(1)", 5.0, True)
+            tracker.record_execution("print(2)", 10.0, True)
+            tracker.record_execution("print(3)", 15.0, False, "err")
 
         history = tracker.get_history(limit=10)
         assert len(history) == 3
@@ -63,24 +102,301 @@ class TestScriptTracker:
         assert not history[0].success
         assert history[1].success
 
+    def test_history_success_is_bool(self, tracker):
+        tracker.record_execution("print(1)", 5.0, True)
+        assert tracker.get_history()[0].success is True
+
     def test_common_scripts(self, tracker):
-        # Run same script 3 times
-        for _ in range(3):
-            tracker.record_execution("print('common')", 5.0, True)
-        # Run another once
-        tracker.record_execution("print('rare')", 5.0, True)
+        with tracker.transaction():
+            # Run same script 3 times
+            for _ in range(3):
+                tracker.record_execution("print('common')", 5.0, True)
+            # Run another once
+            tracker.record_execution("print('rare')", 5.0, True)
 
         common = tracker.get_common_scripts(min_runs=2)
         assert len(common) == 1
         assert common[0].run_count == 3
 
+    def test_common_scripts_ranked_with_preview(self, tracker):
+        for _ in range(3):
+            tracker.record_execution("hot()", 1.0, True)
+        for _ in range(2):
+            tracker.record_execution("warm()", 1.0, False, "oops")
+
+        common = tracker.get_common_scripts(min_runs=2)
+        assert [s.code_preview for s in common] == ["hot()", "warm()"]
+        assert common[1].last_error == "oops"
+
+    def test_common_scripts_uses_covering_index(self, tracker):
+        with tracker._reader() as conn:
+            plan = conn.execute("""
+                EXPLAIN QUERY PLAN
+                SELECT hash, run_count, error_count, total_elapsed_ms, first_seen, last_seen,
+                       code_preview
+                FROM scripts WHERE run_count >= 2 ORDER BY run_count DESC LIMIT 20
+            """).fetchall()
+        assert "COVERING INDEX idx_scripts_top" in plan[0][3]
+
+    def test_history_walks_timestamp_index(self, tracker):
+        with tracker._reader() as conn:
+            plan = conn.execute("EXPLAIN QUERY PLAN " + tracker._HISTORY_SQL, (20,)).fetchall()
+        details = " ".join(row[3] for row in plan)
+        assert "idx_runs_timestamp" in details
+        assert "TEMP B-TREE" not in details
+
+    def test_stats_counts_failures_from_partial_index(self, tracker):
+        with tracker._reader() as conn:
+            plan = conn.execute("EXPLAIN QUERY PLAN " + tracker._STATS_SQL).fetchall()
+        details = [row[3] for row in plan]
+        assert "SCAN script_runs" not in details
+        assert any("idx_runs_failed" in d for d in details)
+
     def test_stats(self, tracker):
-        tracker.record_execution("a()", 5.0, True)
-        tracker.record_execution("a()", 5.0, True)
-        tracker.record_execution("b()", 5.0, False, "err")
+        with tracker.transaction():
+            tracker.record_execution("a()", 5.0, True)
+            tracker.record_execution("a()", 5.0, True)
+            tracker.record_execution("b()", 5.0, False, "err")
 
         stats = tracker.get_stats()
         assert stats["total_unique_scripts"] == 2
         assert stats["total_runs"] == 3
         assert stats["total_errors"] == 1
         assert stats["scripts_run_multiple_times"] == 1
+
+
+class TestPragmas:
+    # Journal mode and a second connection need a database file
+    @pytest.fixture
+    def tracker(self, file_tracker):
+        return file_tracker
+
+    def test_wal_mode_persisted(self, tracker):
+        with sqlite3.connect(tracker.db_path) as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_reads_leave_no_open_transaction(self, tracker):
+        with tracker._reader() as conn:
+            conn.execute("SELECT COUNT(*) FROM scripts").fetchone()
+            assert not conn.in_transaction
+
+
+class TestConnectionReuse:
+    # The read pool is only used for databases on disk
+    @pytest.fixture
+    def tracker(self, file_tracker):
+        return file_tracker
+
+    def test_reader_returned_to_pool(self, tracker):
+        with tracker._reader() as first:
+            pass
+        with tracker._reader() as second:
+            assert second is first
+
+    def test_concurrent_readers_get_distinct_connections(self, tracker):
+        with tracker._reader() as a, tracker._reader() as b:
+            assert a is not b
+            assert a is not tracker._writer()
+
+    def test_pool_is_bounded(self, tracker):
+        seen = set()
+        barrier = threading.Barrier(script_tracker.READ_POOL_SIZE)
+
+        def read():
+            with tracker._reader() as conn:
+                seen.add(id(conn))
+                try:
+                    barrier.wait(timeout=0.5)
+                except threading.BrokenBarrierError:
+                    pass
+
+        threads = [threading.Thread(target=read)
+                   for _ in range(script_tracker.READ_POOL_SIZE * 2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(seen) <= script_tracker.READ_POOL_SIZE
+
+    def test_close_flushes_and_reopens(self, tracker):
+        tracker.record_execution("a()", 1.0, True)
+        tracker.close()
+        assert tracker.get_stats()["total_runs"] == 1
+
+
+class TestInMemory:
+    def test_reads_share_the_writer(self, tracker):
+        tracker.record_execution("a()", 1.0, True)
+        with tracker._reader() as conn:
+            assert conn is tracker._writer()
+        assert tracker.get_stats()["total_runs"] == 1
+
+
+class TestBatchedWrites:
+    # Counts rows through a second connection to the file
+    @pytest.fixture
+    def tracker(self, file_tracker):
+        return file_tracker
+
+    def _db_runs(self, tracker):
+        with sqlite3.connect(tracker.db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM script_runs").fetchone()[0]
+
+    def test_writes_buffered_until_flush(self, tracker):
+        tracker.record_execution("a()", 1.0, True)
+        tracker.record_execution("a()", 2.0, False, "boom")
+        assert self._db_runs(tracker) == 0
+        tracker.flush()
+        assert self._db_runs(tracker) == 2
+        script = tracker.get_script(ScriptTracker.hash_code("a()"))
+        assert script.run_count == 2
+        assert script.error_count == 1
+        assert script.last_error == "boom"
+
+    def test_flush_on_record_limit(self, tracker, monkeypatch):
+        monkeypatch.setattr(script_tracker, "FLUSH_MAX_RECORDS", 3)
+        for i in range(3):
+            tracker.record_execution(f"f({i})", 1.0, True)
+        assert self._db_runs(tracker) == 3
+
+    def test_transaction_defers_limit_flush(self, tracker, monkeypatch):
+        monkeypatch.setattr(script_tracker, "FLUSH_MAX_RECORDS", 2)
+        with tracker.transaction():
+            with tracker.transaction():
+                for i in range(3):
+                    tracker.record_execution(f"f({i})", 1.0, True)
+            assert self._db_runs(tracker) == 0
+        assert self._db_runs(tracker) == 3
+
+    def test_overdue_runs_flushed_without_another_record(self, tracker, monkeypatch):
+        monkeypatch.setattr(script_tracker, "FLUSH_MAX_AGE_S", 0.05)
+        tracker.record_execution("a()", 1.0, True)
+        for _ in range(100):
+            if self._db_runs(tracker):
+                break
+            time.sleep(0.02)
+        assert self._db_runs(tracker) == 1
+
+    def test_failed_flush_keeps_runs(self, tracker, monkeypatch):
+        tracker.record_execution("a()", 1.0, True)
+        monkeypatch.setattr(tracker, "_INSERT_RUN_SQL", "INSERT INTO no_such_table VALUES (?)")
+        with pytest.raises(sqlite3.OperationalError):
+            tracker.flush()
+        monkeypatch.undo()
+        tracker.record_execution("a()", 2.0, False, "boom")
+        tracker.flush()
+        assert self._db_runs(tracker) == 2
+        script = tracker.get_script(ScriptTracker.hash_code("a()"))
+        assert script.run_count == 2
+        assert script.total_elapsed_ms == pytest.approx(3.0)
+        assert script.last_error == "boom"
+
+    def test_statistics_refreshed_after_many_runs(self, tracker, monkeypatch):
+        monkeypatch.setattr(script_tracker, "ANALYZE_EVERY_RUNS", 4)
+        with sqlite3.connect(tracker.db_path) as conn:
+            tables = "SELECT COUNT(*) FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            assert conn.execute(tables).fetchone()[0] == 0
+            with tracker.transaction():
+                for i in range(4):
+                    tracker.record_execution(f"f({i})", 1.0, True)
+            assert conn.execute(tables).fetchone()[0] == 1
+
+    def test_batches_merge_with_existing_rows(self, tracker):
+        tracker.record_execution("a()", 1.0, False, "first")
+        tracker.flush()
+        tracker.record_execution("a()", 2.0, True)
+        script = tracker.get_script(ScriptTracker.hash_code("a()"))
+        assert script.run_count == 2
+        assert script.total_elapsed_ms == pytest.approx(3.0)
+        # A successful run doesn't clear the last recorded error
+        assert script.last_error == "first"
+
+
+class TestLifecycle:
+    def test_close_unregisters_exit_flush(self, monkeypatch):
+        registered = []
+        monkeypatch.setattr(script_tracker.atexit, "register", registered.append)
+        monkeypatch.setattr(script_tracker.atexit, "unregister", registered.remove)
+        tracker = ScriptTracker(db_path=":memory:")
+        assert registered == [tracker.flush]
+        tracker.close()
+        assert registered == []
+
+
+class TestHashBackend:
+    def test_sha256_fallback(self, monkeypatch):
+        import hashlib
+        monkeypatch.setattr(script_tracker, "blake3", None)
+        monkeypatch.setattr(script_tracker, "HASH_ALGO", "sha256")
+        assert script_tracker.hash_backend().startswith("sha256")
+        assert ScriptTracker.hash_code("x") == hashlib.sha256(b"x").hexdigest()
+
+
+class TestHashMigration:
+    def test_sha256_database_rekeyed(self, tmp_path, monkeypatch):
+        pytest.importorskip("blake3")
+        db_path = str(tmp_path / "legacy.db")
+        with monkeypatch.context() as m:
+            m.setattr(script_tracker, "blake3", None)
+            m.setattr(script_tracker, "HASH_ALGO", "sha256")
+            old = ScriptTracker(db_path=db_path)
+            old_hash = old.record_execution("a()", 2.0, True)
+            old.record_execution("a()", 3.0, False, "err")
+            old.close()
+
+        tracker = ScriptTracker(db_path=db_path)
+        new_hash = ScriptTracker.hash_code("a()")
+        assert new_hash != old_hash
+        script = tracker.get_script(new_hash)
+        assert script.run_count == 2
+        assert script.error_count == 1
+        assert {r.hash for r in tracker.get_history()} == {new_hash}
+        tracker.close()
+
+
+class TestCodeStorage:
+    LONG = "-- " + "x" * 5000 + "\nreturn 1"
+
+    def test_long_code_roundtrip(self, tracker):
+        h = tracker.record_execution(self.LONG, 1.0, True)
+        tracker.record_execution(self.LONG, 1.0, True)
+        assert tracker.get_script(h).code == self.LONG
+        listed = tracker.get_common_scripts()[0]
+        assert listed.code is None
+        assert listed.code_preview == self.LONG[:100] + "..."
+
+    def test_preview_flattens_newlines(self, tracker):
+        h = tracker.record_execution("local a = 1\nreturn a", 1.0, True)
+        assert tracker.get_script(h).code_preview == "local a = 1 return a"
+
+    def test_scripts_row_holds_prefix_only(self, tracker):
+        h = tracker.record_execution(self.LONG, 1.0, True)
+        tracker.flush()
+        with tracker._reader() as conn:
+            prefix = conn.execute("SELECT code FROM scripts WHERE hash = ?", (h,)).fetchone()[0]
+            blob = conn.execute("SELECT code FROM script_code WHERE hash = ?", (h,)).fetchone()[0]
+        assert prefix == self.LONG[:script_tracker.CODE_PREFIX_CHARS]
+        assert len(blob) < len(self.LONG)
+
+    def test_legacy_full_code_migrated(self, tmp_path):
+        import hashlib
+        db_path = str(tmp_path / "legacy.db")
+        code = "print('legacy') " * 50
+        old_hash = hashlib.sha256(code.encode()).hexdigest()
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("""
+                CREATE TABLE scripts (
+                    hash TEXT PRIMARY KEY, code TEXT NOT NULL,
+                    run_count INTEGER DEFAULT 0, error_count INTEGER DEFAULT 0,
+                    total_elapsed_ms REAL DEFAULT 0, first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL, last_error TEXT)
+            """)
+            conn.execute("INSERT INTO scripts VALUES (?, ?, 4, 0, 8.0, 1.0, 2.0, NULL)",
+                         (old_hash, code))
+
+        tracker = ScriptTracker(db_path=db_path)
+        script = tracker.get_script(ScriptTracker.hash_code(code))
+        assert script.code == code
+        assert script.run_count == 4
+        assert script.code_preview == code[:100] + "..."
+        tracker.close()
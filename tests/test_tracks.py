@@ -0,0 +1,62 @@
+"""Tests for server/tools/tracks.py"""
+
+import asyncio
+import pytest
+
+pytest.importorskip("mcp.server.fastmcp")
+
+from server.connection import ReaperConnection
+from server.tools import tracks
+from tests.test_connection import FakeBridge
+
+
+def _project_bridge(state):
+    """Answer exec_cached edits like a bridge over an unchanging project:
+    state["generation"] is reported with every reply, and state["hints"]
+    logs whether each request's hint would pass resolve_track's check."""
+    async def handler(bridge, reader, writer):
+        while True:
+            try:
+                req = await bridge.recv(reader)
+            except (asyncio.IncompleteReadError, ValueError):
+                break
+            hint = req["params"]["args"].get("hint")
+            state["hints"].append(hint is not None and hint["generation"] == state["generation"])
+            result = {"success": True, "result": {"name": "Bass", "index": 1}}
+            if state["generation"] is not None:
+                result["generation"] = state["generation"]
+            bridge.send(writer, {"result": result, "error": None, "id": req["id"]})
+            await writer.drain()
+        writer.close()
+    return handler
+
+
+class TestTrackHints:
+    @pytest.fixture(autouse=True)
+    def no_hints(self, monkeypatch):
+        monkeypatch.setattr(tracks, "_track_hints", {})
+
+    async def _edit_twice(self, state, monkeypatch):
+        async with FakeBridge(_project_bridge(state), "length") as bridge:
+            conn = ReaperConnection(port=bridge.port)
+            monkeypatch.setattr(tracks, "get_connection", lambda: conn)
+            try:
+                for _ in range(2):
+                    edit = await tracks._edit_track("tracks.pan", "bass", tracks._SET_PAN_LUA,
+                                                    {"pan": 0.0}, undo_label="Pan: bass")
+                    assert edit["name"] == "Bass"
+            finally:
+                await conn.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_hint_from_reply_accepted_next_time(self, monkeypatch):
+        state = {"generation": "proj:7", "hints": []}
+        await self._edit_twice(state, monkeypatch)
+        assert state["hints"] == [False, True]
+
+    @pytest.mark.asyncio
+    async def test_no_hint_without_reported_generation(self, monkeypatch):
+        state = {"generation": None, "hints": []}
+        await self._edit_twice(state, monkeypatch)
+        assert state["hints"] == [False, False]
+        assert tracks._track_hints == {}